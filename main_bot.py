@@ -1,12 +1,27 @@
+import time
+_startup_started = time.perf_counter()
+
 import os
 import logging
-import csv
+import asyncio
+import html
 import io
 import json
-from datetime import datetime
-from flask import Flask, render_template_string
+import struct
+import threading
+import zlib
+from array import array
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from types import MappingProxyType
+_stdlib_imported = time.perf_counter()
+
+# Flask, csv, sqlite3, multiprocessing и pyarrow импортируются при первом использовании,
+# чтобы не замедлять запуск бота
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
+from telegram.error import Forbidden, RetryAfter, TelegramError
+from telegram.ext import Application, ApplicationHandlerStop, CommandHandler, CallbackQueryHandler, ContextTypes, TypeHandler
+_telegram_imported = time.perf_counter()
 
 # Настройка логирования
 logging.basicConfig(
@@ -14,11 +29,92 @@ logging.basicConfig(
     level=logging.INFO
 )
 
+class StartupTimeline:
+    """Замеры этапов запуска для лога (импорты, хранилище, веб, готовность бота)"""
+    
+    def __init__(self, started: float):
+        self.started = started
+        self.last = started
+        self.steps = []
+    
+    def add(self, name: str, seconds: float):
+        self.steps.append((name, seconds))
+    
+    def mark(self, name: str):
+        """Отмечает окончание этапа, начавшегося после предыдущей отметки"""
+        now = time.perf_counter()
+        self.steps.append((name, now - self.last))
+        self.last = now
+    
+    def log(self):
+        steps = ", ".join(f"{name} {seconds * 1000:.0f} мс" for name, seconds in self.steps)
+        logging.info(f"Запуск: {steps}; всего {(time.perf_counter() - self.started) * 1000:.0f} мс")
+
+startup_timeline = StartupTimeline(_startup_started)
+startup_timeline.add("стандартная библиотека", _stdlib_imported - _startup_started)
+startup_timeline.add("telegram", _telegram_imported - _stdlib_imported)
+startup_timeline.last = _telegram_imported
+
 # Конфигурация
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
 ADMIN_ID = os.environ.get("ADMIN_ID", "")  # ID администратора через запятую
 PORT = int(os.environ.get("PORT", 5000))
 
+# Шардированный режим: несколько процессов-обработчиков делят пользователей между собой
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT", 1))
+AGGREGATE_DB = os.environ.get("AGGREGATE_DB", "survey_aggregate.sqlite3")
+
+# Лимиты Telegram для текстовых отчетов
+REPORT_PAGE_LIMIT = 3800           # Лимит сообщения 4096 UTF-16 символов с запасом под <pre> и заголовок
+REPORT_SEND_INTERVAL = 1.0         # Пауза между сообщениями в один чат (сек)
+
+# Ограничения памяти: сколько участников держать в памяти и когда выгружать неактивных
+MAX_RESIDENT_USERS = int(os.environ.get("MAX_RESIDENT_USERS", 20000))
+SESSION_TTL_SECONDS = int(os.environ.get("SESSION_TTL_SECONDS", 3 * 24 * 3600))
+MEMORY_CHECK_INTERVAL = int(os.environ.get("MEMORY_CHECK_INTERVAL", 300))
+USER_ARCHIVE_DB = os.environ.get("USER_ARCHIVE_DB", "survey_users_archive.sqlite3")
+
+# Массовые рассылки: общий лимит Telegram ~30 сообщений в секунду
+BROADCAST_RATE = float(os.environ.get("BROADCAST_RATE", 25))
+BROADCAST_CONCURRENCY = int(os.environ.get("BROADCAST_CONCURRENCY", 10))
+
+# Живой опрос: сколько секунд открыто голосование по вопросу
+LIVE_VOTE_SECONDS = int(os.environ.get("LIVE_VOTE_SECONDS", 60))
+
+# Напоминания незавершившим опрос: размер пакета и файл состояния для возобновления
+REMINDER_BATCH_SIZE = int(os.environ.get("REMINDER_BATCH_SIZE", 500))
+REMINDER_STATE_FILE = os.environ.get("REMINDER_STATE_FILE", "reminder_campaign.json")
+
+# Контрольные точки и остановка: файл состояния, период сохранения и лимит времени на остановку
+CHECKPOINT_FILE = os.environ.get("CHECKPOINT_FILE", "survey_checkpoint.json")
+CHECKPOINT_INTERVAL = int(os.environ.get("CHECKPOINT_INTERVAL", 60))
+SHUTDOWN_DEADLINE = float(os.environ.get("SHUTDOWN_DEADLINE", 10))
+
+# Журнал голосов (аудит): файл, размер для ротации и количество старых файлов
+AUDIT_LOG_FILE = os.environ.get("AUDIT_LOG_FILE", "survey_audit.log")
+AUDIT_MAX_BYTES = int(os.environ.get("AUDIT_MAX_BYTES", 8 * 1024 * 1024))
+AUDIT_BACKUP_COUNT = int(os.environ.get("AUDIT_BACKUP_COUNT", 3))
+
+# Защита от флуда: лимиты обновлений за окно THROTTLE_WINDOW секунд на пользователя и
+# на весь бот (в шардированном режиме - на процесс), режим "drop" (молча отбрасывать)
+# или "alert" (один раз за окно предупредить пользователя).
+# Ответы живого опроса при открытом голосовании в общий лимит не входят: после рассылки
+# вопроса тысячам участников их нажатия легко превысят THROTTLE_GLOBAL_LIMIT
+THROTTLE_WINDOW = float(os.environ.get("THROTTLE_WINDOW", 10))
+THROTTLE_USER_LIMIT = int(os.environ.get("THROTTLE_USER_LIMIT", 20))
+THROTTLE_GLOBAL_LIMIT = int(os.environ.get("THROTTLE_GLOBAL_LIMIT", 600))
+THROTTLE_MAX_TRACKED = int(os.environ.get("THROTTLE_MAX_TRACKED", 50000))
+THROTTLE_MODE = os.environ.get("THROTTLE_MODE", "alert").lower()
+
+# Веб-интерфейс: "thread" - Flask в отдельном потоке, "async" - aiohttp в цикле событий бота
+WEB_MODE = os.environ.get("WEB_MODE", "thread").lower()
+
+# Аналитика (корреляции вопросов, трудность, когорты): период пересчета в секундах
+ANALYTICS_INTERVAL = int(os.environ.get("ANALYTICS_INTERVAL", 300))
+
+# Экспорт ответов в Parquet: количество строк в одной группе строк
+PARQUET_ROW_GROUP_SIZE = int(os.environ.get("PARQUET_ROW_GROUP_SIZE", 50000))
+
 # Получаем список ID администраторов
 admin_ids = [int(x.strip()) for x in ADMIN_ID.split(',')] if ADMIN_ID else []
 
@@ -44,6 +140,74 @@ CORRECT_ANSWERS = {
     6: "yes"   # Вопрос 7 - "да"
 }
 
+# Статические файлы веб-отчета (стили и графики) отдаются самим приложением
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_MAX_AGE = 365 * 24 * 3600  # Файлы версионируются хэшем, поэтому кэшируются надолго
+
+_static_versions = {}
+
+def static_asset_url(name: str) -> str:
+    """URL статического файла с версией по хэшу содержимого (для долгого кэширования)"""
+    version = _static_versions.get(name)
+    if version is None:
+        import hashlib
+        with open(os.path.join(STATIC_DIR, name), "rb") as file:
+            version = hashlib.sha1(file.read()).hexdigest()[:10]
+        _static_versions[name] = version
+    return f"/static/{name}?v={version}"
+
+# Кэш карточек вопросов HTML-отчета: question_id -> (ключ, html, данные, % правильных).
+# Ключ включает счетчики, поэтому карточка пересобирается только при их изменении.
+report_fragment_cache = {}
+
+def render_question_fragment(question_id: int, yes: int, no: int):
+    """Карточка вопроса для HTML-отчета (из кэша, если счетчики не менялись)"""
+    key = (yes, no, QUESTIONS[question_id], CORRECT_ANSWERS[question_id])
+    cached = report_fragment_cache.get(question_id)
+    if cached is not None and cached[0] == key:
+        return cached[1], cached[2], cached[3]
+    
+    total = yes + no
+    yes_percent = (yes / total * 100) if total > 0 else 0
+    no_percent = (no / total * 100) if total > 0 else 0
+    
+    # Определяем правильный ответ и статистику
+    correct_answer_text = "Да" if CORRECT_ANSWERS[question_id] == "yes" else "Нет"
+    correct_count = yes if CORRECT_ANSWERS[question_id] == "yes" else no
+    incorrect_count = total - correct_count
+    correct_percent = (correct_count / total * 100) if total > 0 else 0
+    incorrect_percent = (incorrect_count / total * 100) if total > 0 else 0
+    
+    fragment = f"""
+    <div class="stats-card">
+        <h3>Вопрос {question_id + 1}</h3>
+        <div class="question-card">
+            <p><strong>{html.escape(QUESTIONS[question_id])}</strong></p>
+            <p class="correct-answer">✅ Правильный ответ: {correct_answer_text}</p>
+        </div>
+
+        <div class="comparison">
+            <p><strong>Сравнение с эталоном:</strong></p>
+            <p>Правильных ответов: {correct_count} ({correct_percent:.1f}%)</p>
+            <p>Неправильных ответов: {incorrect_count} ({incorrect_percent:.1f}%)</p>
+        </div>
+
+        <div class="chart-container">
+            <canvas id="chart{question_id}"></canvas>
+        </div>
+        <p><strong>Результаты:</strong> ✅ Да: {yes} ({yes_percent:.1f}%) | ❌ Нет: {no} ({no_percent:.1f}%)</p>
+    </div>
+"""
+    data = {
+        "number": question_id + 1,
+        "yes": yes,
+        "no": no,
+        "yes_percent": f"{yes_percent:.1f}",
+        "no_percent": f"{no_percent:.1f}",
+    }
+    report_fragment_cache[question_id] = (key, fragment, data, correct_percent)
+    return fragment, data, correct_percent
+
 # Хранилище результатов
 class ResultsStorage:
     def __init__(self):
@@ -51,38 +215,395 @@ class ResultsStorage:
         self.user_progress = {}  # Храним прогресс пользователей
         self.user_answers = {}   # Детальные ответы пользователей
         self.user_info = {}      # Информация о пользователях
+        self.aggregator = None   # Общий слой агрегации (только в шардированном режиме)
+        self.archive = None      # Архив выгруженных из памяти участников
+        # Участники, возвращенные в память из архива: user_id -> номер возврата.
+        # Их строка в архиве удаляется только после контрольной точки с ними.
+        self.archived_resident = {}
+        self._reload_seq = 0
+        # Индекс незавершивших опрос: user_id -> (last_active, отвечено вопросов),
+        # упорядочен от давно неактивных к недавним (включая выгруженных в архив)
+        self.activity_index = OrderedDict()
+        self.version = 0         # Увеличивается при каждом изменении результатов
+        self.audit_log = None    # Журнал всех голосов (включая отклоненные)
+        self.participants_total = None  # Число участников, зафиксированное в снимке только со счетчиками
+        # Пользователи, изменившиеся с прошлого пересчета аналитики
+        self.analytics_dirty = set()
+        self.analytics_dirty_all = True
     
     def add_vote(self, question_id: int, answer: str, user_id: int, username: str = "", first_name: str = ""):
         # Администраторы не могут участвовать в опросе
         if user_id in admin_ids:
+            if self.audit_log is not None:
+                self.audit_log.append(user_id, question_id, AuditLog.REJECTED_ADMIN, answer)
             return False
             
         if question_id in self.results and answer in self.results[question_id]:
-            # Обновляем общую статистику
-            self.results[question_id][answer] += 1
+            # Участник мог быть выгружен из памяти - возвращаем его прогресс
+            self.ensure_loaded(user_id)
+            
+            previous = self.user_progress.get(user_id, {}).get(question_id)
+            if self.audit_log is not None:
+                if previous is None:
+                    event = AuditLog.ACCEPTED
+                elif previous == answer:
+                    event = AuditLog.DUPLICATE
+                else:
+                    event = AuditLog.CHANGED
+                self.audit_log.append(user_id, question_id, event, answer)
+            
+            # Обновляем общую статистику: у участника один голос на вопрос
+            # (повторный ответ, например в живом опросе, не добавляет голос, а измененный - переносит)
+            if previous != answer:
+                if previous is not None:
+                    self.results[question_id][previous] -= 1
+                self.results[question_id][answer] += 1
             
             # Сохраняем прогресс пользователя
+            timestamp = datetime.now().isoformat()
             if user_id not in self.user_progress:
                 self.user_progress[user_id] = {}
                 self.user_answers[user_id] = {}
                 self.user_info[user_id] = {
                     "username": username,
                     "first_name": first_name,
-                    "last_active": datetime.now().isoformat()
+                    "joined": timestamp,
+                    "last_active": timestamp
                 }
             
             self.user_progress[user_id][question_id] = answer
             self.user_answers[user_id][question_id] = {
                 "answer": answer,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": timestamp
             }
-            self.user_info[user_id]["last_active"] = datetime.now().isoformat()
+            self.user_info[user_id]["last_active"] = timestamp
+            self._touch_activity(user_id, timestamp, len(self.user_progress[user_id]))
+            self.analytics_dirty.add(user_id)
+            self.version += 1
+            
+            # В шардированном режиме счетчики сводятся в общий слой агрегации
+            if self.aggregator is not None:
+                self.aggregator.record_vote(question_id, answer, user_id, self.user_info[user_id], timestamp)
             return True
+        
+        if self.audit_log is not None:
+            self.audit_log.append(user_id, question_id, AuditLog.REJECTED_INVALID, answer)
         return False
     
+    def add_votes_batch(self, votes):
+        """Быстрая пакетная загрузка голосов (импорт и восстановление состояния).
+        
+        votes - последовательность кортежей
+        (user_id, username, first_name, question_id, answer, timestamp).
+        Голоса проверяются по CORRECT_ANSWERS; голоса администраторов и
+        некорректные строки пропускаются. Уже загруженные голоса (тот же ответ
+        или более новый ответ на этот вопрос) тоже пропускаются, поэтому
+        повторный импорт того же файла ничего не меняет. Возвращает
+        (принято, отклонено).
+        """
+        results = self.results
+        user_progress = self.user_progress
+        user_answers = self.user_answers
+        user_info = self.user_info
+        admins = set(admin_ids)
+        accepted = []
+        rejected = 0
+        
+        for user_id, username, first_name, question_id, answer, timestamp in votes:
+            if user_id in admins or question_id not in CORRECT_ANSWERS or answer not in ("yes", "no"):
+                rejected += 1
+                continue
+            
+            progress = user_progress.get(user_id)
+            if progress is None and self.ensure_loaded(user_id):
+                progress = user_progress[user_id]
+            previous = progress.get(question_id) if progress is not None else None
+            if previous is not None:
+                if previous == answer or user_answers[user_id][question_id]["timestamp"] > timestamp:
+                    rejected += 1
+                    continue
+                # Ответ изменился - переносим голос в счетчиках
+                results[question_id][previous] -= 1
+            results[question_id][answer] += 1
+            
+            if progress is None:
+                progress = user_progress[user_id] = {}
+                user_answers[user_id] = {}
+                user_info[user_id] = {
+                    "username": username,
+                    "first_name": first_name,
+                    "joined": timestamp,
+                    "last_active": timestamp
+                }
+            elif timestamp > user_info[user_id]["last_active"]:
+                user_info[user_id]["last_active"] = timestamp
+            
+            progress[question_id] = answer
+            user_answers[user_id][question_id] = {"answer": answer, "timestamp": timestamp}
+            accepted.append((user_id, username, first_name, question_id, answer, timestamp))
+        
+        applied = len(accepted)
+        if self.aggregator is not None and accepted:
+            # Голос мог быть уже записан в общую базу другим процессом
+            applied = self.aggregator.record_votes_batch(accepted)
+            rejected += len(accepted) - applied
+        if accepted:
+            # Время ответов в пакете произвольное - проще перестроить индекс целиком
+            self.rebuild_activity_index()
+            self.analytics_dirty_all = True
+            self.version += 1
+        return applied, rejected
+    
+    def _touch_activity(self, user_id: int, last_active: str, answered: int):
+        """Обновляет индекс активности после ответа пользователя"""
+        if answered >= len(QUESTIONS):
+            self.activity_index.pop(user_id, None)
+        else:
+            self.activity_index[user_id] = (last_active, answered)
+            self.activity_index.move_to_end(user_id)
+    
+    def rebuild_activity_index(self):
+        """Строит индекс незавершивших опрос заново (при запуске и после импорта)"""
+        questions_count = len(QUESTIONS)
+        entries = [
+            (info.get("last_active", ""), user_id, len(answers))
+            for user_id, info, answers in self.iter_users()
+            if len(answers) < questions_count
+        ]
+        entries.sort()
+        self.activity_index = OrderedDict(
+            (user_id, (last_active, answered)) for last_active, user_id, answered in entries
+        )
+    
+    def select_inactive_users(self, inactive_seconds: int = 0, limit: int = None):
+        """Незавершившие опрос пользователи без активности дольше inactive_seconds.
+        
+        Индекс упорядочен по времени активности, поэтому просматриваются только
+        подходящие записи, а не все участники.
+        """
+        cutoff = (datetime.now() - timedelta(seconds=inactive_seconds)).isoformat()
+        selected = []
+        for user_id, (last_active, _) in self.activity_index.items():
+            if last_active > cutoff or (limit is not None and len(selected) >= limit):
+                break
+            selected.append(user_id)
+        return selected
+    
     def get_user_progress(self, user_id: int):
+        self.ensure_loaded(user_id)
         return self.user_progress.get(user_id, {})
     
+    def ensure_loaded(self, user_id: int):
+        """Возвращает в память участника, выгруженного в архив.
+        
+        Строка архива остается, пока участник не попадет в контрольную точку
+        (см. release_archived), иначе после сбоя его ответы были бы потеряны.
+        """
+        if self.archive is None or user_id in self.user_info:
+            return False
+        record = self.archive.get(user_id)
+        if record is None:
+            return False
+        info, answers = record
+        self.user_info[user_id] = info
+        self.user_answers[user_id] = answers
+        self.user_progress[user_id] = {question_id: details["answer"] for question_id, details in answers.items()}
+        if self.aggregator is not None:
+            # В шардированном режиме ответы надежно хранятся в общей базе
+            self.archive.delete_many([user_id])
+        else:
+            self._reload_seq += 1
+            self.archived_resident[user_id] = self._reload_seq
+        self.version += 1
+        return True
+    
+    def release_archived(self, reloaded: dict):
+        """Удаляет из архива строки участников, вернувшихся в память, после записи
+        контрольной точки. reloaded - копия archived_resident на момент снимка:
+        если участника с тех пор снова выгружали, его строка не трогается."""
+        released = [
+            user_id for user_id, seq in reloaded.items()
+            if self.archived_resident.get(user_id) == seq and user_id in self.user_info
+        ]
+        if released:
+            self.archive.delete_many(released)
+            for user_id in released:
+                del self.archived_resident[user_id]
+        return len(released)
+    
+    def evict_users(self, user_ids):
+        """Выгружает участников из памяти в архив"""
+        records = [
+            (user_id, self.user_info[user_id], self.user_answers.get(user_id, {}))
+            for user_id in user_ids if user_id in self.user_info
+        ]
+        if not records:
+            return 0
+        self.archive.save_many(records)
+        for user_id, _, _ in records:
+            del self.user_info[user_id]
+            self.user_progress.pop(user_id, None)
+            self.user_answers.pop(user_id, None)
+            self.archived_resident.pop(user_id, None)
+        # Выгруженные участники больше не попадают в контрольную точку - она должна обновиться
+        self.version += 1
+        return len(records)
+    
+    def enforce_memory_limits(self, max_resident: int = MAX_RESIDENT_USERS, ttl_seconds: int = SESSION_TTL_SECONDS):
+        """Выгружает в архив неактивных и "холодных" участников.
+        
+        Незавершенные сессии без активности дольше ttl_seconds выгружаются всегда,
+        а если участников в памяти больше max_resident - дополнительно выгружаются
+        давно неактивные участники, завершившие опрос.
+        """
+        if self.archive is None:
+            return 0
+        
+        questions_count = len(QUESTIONS)
+        cutoff = (datetime.now() - timedelta(seconds=ttl_seconds)).isoformat()
+        expired = [
+            user_id for user_id, info in self.user_info.items()
+            if len(self.user_progress.get(user_id, {})) < questions_count and info.get("last_active", "") < cutoff
+        ]
+        evicted = self.evict_users(expired)
+        
+        overflow = len(self.user_info) - max_resident
+        if max_resident > 0 and overflow > 0:
+            completed = sorted(
+                (info.get("last_active", ""), user_id) for user_id, info in self.user_info.items()
+                if len(self.user_progress.get(user_id, {})) >= questions_count
+            )
+            evicted += self.evict_users(user_id for _, user_id in completed[:overflow])
+            if len(self.user_info) > max_resident:
+                logging.warning(f"В памяти {len(self.user_info)} участников с незавершенным опросом (лимит {max_resident})")
+        
+        if evicted:
+            logging.info(f"Выгружено в архив участников: {evicted}, в памяти: {len(self.user_info)}")
+        return evicted
+    
+    def checkpoint_payload(self):
+        """Снимок результатов и участников в памяти (JSON) для контрольной точки"""
+        return json.dumps({
+            "saved_at": datetime.now().isoformat(),
+            "results": self.results,
+            "users": {
+                str(user_id): {"info": info, "answers": self.user_answers.get(user_id, {})}
+                for user_id, info in self.user_info.items()
+            },
+        }, ensure_ascii=False)
+    
+    def load_checkpoint(self, path: str):
+        """Восстанавливает состояние из контрольной точки; возвращает число восстановленных голосов"""
+        try:
+            with open(path, encoding="utf-8") as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return 0
+        
+        for question_id, stats in state["results"].items():
+            if int(question_id) in self.results:
+                self.results[int(question_id)] = {"yes": stats.get("yes", 0), "no": stats.get("no", 0)}
+        archived_ids = self.archive.ids() if self.archive is not None else set()
+        stale_archived = []
+        for user_id, record in state["users"].items():
+            user_id = int(user_id)
+            if user_id in archived_ids:
+                # Участник есть и в архиве: он выгружен после контрольной точки
+                # (архив новее) или возвращен в память и сохранен в ней (точка новее)
+                archived_info, _ = self.archive.get(user_id)
+                if archived_info.get("last_active", "") > record["info"].get("last_active", ""):
+                    continue
+                stale_archived.append(user_id)
+            answers = {int(question_id): details for question_id, details in record["answers"].items()}
+            self.user_info[user_id] = record["info"]
+            self.user_answers[user_id] = answers
+            self.user_progress[user_id] = {question_id: details["answer"] for question_id, details in answers.items()}
+        if stale_archived:
+            self.archive.delete_many(stale_archived)
+        if self.archive is not None:
+            # Голоса участников, выгруженных после контрольной точки, есть только в архиве -
+            # пересчитываем счетчики по сохраненным ответам
+            self.results = {i: {"yes": 0, "no": 0} for i in range(len(QUESTIONS))}
+            for _, _, answers in self.iter_users():
+                for question_id, details in answers.items():
+                    if question_id in self.results and details["answer"] in self.results[question_id]:
+                        self.results[question_id][details["answer"]] += 1
+        self.analytics_dirty_all = True
+        self.version += 1
+        
+        logging.info(f"Контрольная точка от {state.get('saved_at')}: участников {len(state['users'])}")
+        return sum(sum(stats.values()) for stats in self.results.values())
+    
+    def participants_count(self):
+        """Количество участников: в памяти и в архиве"""
+        if self.participants_total is not None:
+            return self.participants_total
+        archived = self.archive.count() if self.archive is not None else 0
+        # Возвращенные в память участники до контрольной точки есть и в архиве
+        return len(self.user_info) + archived - len(self.archived_resident)
+    
+    def iter_users(self):
+        """Перебирает всех участников (в памяти и в архиве): (user_id, info, answers)"""
+        resident = list(self.user_info.items())
+        for user_id, info in resident:
+            yield user_id, info, self.user_answers.get(user_id, {})
+        if self.archive is not None:
+            # Экспорт в потоке веб-сервера может идти одновременно с выгрузкой:
+            # участник, выгруженный после копирования списка, уже выдан выше
+            yielded = {user_id for user_id, _ in resident}
+            for user_id, info, answers in self.archive.iter_all():
+                if user_id not in yielded:
+                    yield user_id, info, answers
+    
+    def snapshot(self, include_users: bool = True, participants: int = None):
+        """Копия данных в памяти для построения отчетов вне цикла событий.
+        
+        Копируются только словари (без обращения к диску), поэтому снимок
+        делается быстро в потоке бота, а тяжелый отчет строится в другом потоке.
+        Без include_users копируются только счетчики, а число участников
+        фиксируется значением participants.
+        """
+        copy = ResultsStorage()
+        copy.results = {question_id: dict(stats) for question_id, stats in self.results.items()}
+        if not include_users:
+            copy.participants_total = participants
+            return copy
+        copy.user_progress = {user_id: dict(progress) for user_id, progress in self.user_progress.items()}
+        copy.user_answers = {
+            user_id: {question_id: dict(details) for question_id, details in answers.items()}
+            for user_id, answers in self.user_answers.items()
+        }
+        copy.user_info = {user_id: dict(info) for user_id, info in self.user_info.items()}
+        copy.archive = self.archive
+        copy.version = self.version
+        return copy
+    
+    def memory_report(self):
+        """Оценка памяти, занимаемой хранилищем, и памяти процесса"""
+        import sys
+        approx_bytes = sum(sys.getsizeof(container) for container in (self.user_info, self.user_progress, self.user_answers))
+        for user_id, info in self.user_info.items():
+            approx_bytes += sys.getsizeof(info) + sum(sys.getsizeof(value) for value in info.values())
+            approx_bytes += sys.getsizeof(self.user_progress.get(user_id, {}))
+            answers = self.user_answers.get(user_id, {})
+            approx_bytes += sys.getsizeof(answers)
+            for details in answers.values():
+                approx_bytes += sys.getsizeof(details) + sys.getsizeof(details["timestamp"])
+        
+        rss_bytes = None
+        try:
+            with open("/proc/self/statm") as statm:
+                rss_bytes = int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            pass
+        
+        return {
+            "resident_users": len(self.user_info),
+            "archived_users": self.archive.count() if self.archive is not None else 0,
+            "storage_bytes": approx_bytes,
+            "rss_bytes": rss_bytes,
+        }
+    
     def get_next_question(self, user_id: int):
         # Администраторы не могут участвовать в опросе
         if user_id in admin_ids:
@@ -107,9 +628,18 @@ class ResultsStorage:
         self.results = {i: {"yes": 0, "no": 0} for i in range(len(QUESTIONS))}
         self.user_progress = {}
         self.user_answers = {}
+        self.activity_index = OrderedDict()
+        self.archived_resident = {}
+        self.analytics_dirty_all = True
+        self.version += 1
+        if self.aggregator is not None:
+            self.aggregator.reset()
+        if self.archive is not None:
+            self.archive.clear()
     
     def export_to_csv(self):
         """Экспорт результатов в CSV формат для Google Sheets"""
+        import csv
         output = io.StringIO()
         writer = csv.writer(output)
         
@@ -147,8 +677,8 @@ class ResultsStorage:
         writer.writerow(["User Statistics"])
         writer.writerow(["User ID", "Username", "Name", "Completed Questions", "Completion %", "Last Active"])
         
-        for user_id, info in self.user_info.items():
-            completed = len(self.user_progress.get(user_id, {}))
+        for user_id, info, answers in self.iter_users():
+            completed = len(answers)
             completion_pct = (completed / len(QUESTIONS)) * 100
             
             writer.writerow([
@@ -160,239 +690,164 @@ class ResultsStorage:
                 info.get("last_active", "")
             ])
         
+        # Ответы пользователей (по одной строке на ответ) - для анализа и импорта
+        writer.writerow([])
+        writer.writerow(["Answers"])
+        writer.writerow(["User ID", "Username", "Name", "Question Number", "Answer", "Timestamp"])
+        
+        for user_id, info, answers in self.iter_users():
+            for question_id, details in sorted(answers.items()):
+                writer.writerow([
+                    user_id,
+                    info.get("username", ""),
+                    info.get("first_name", ""),
+                    f"Q{question_id+1}",
+                    details["answer"],
+                    details["timestamp"]
+                ])
+        
         return output.getvalue()
     
-    def export_to_html_report(self):
-        """Создание интерактивного HTML отчета с графиками"""
-        html_template = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Результаты опроса - Практикум для воспитателей</title>
-            <meta charset="utf-8">
-            <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-            <style>
-                body { font-family: Arial, sans-serif; max-width: 1200px; margin: 0 auto; padding: 20px; }
-                .header { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; border-radius: 10px; margin-bottom: 30px; }
-                .stats-card { background: white; padding: 20px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); margin-bottom: 20px; }
-                .question-card { background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 15px 0; border-left: 4px solid #007bff; }
-                .chart-container { height: 300px; margin: 20px 0; }
-                .summary-grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 15px; margin: 20px 0; }
-                .summary-item { background: white; padding: 15px; border-radius: 8px; text-align: center; box-shadow: 0 2px 5px rgba(0,0,0,0.1); }
-                .percentage { font-size: 24px; font-weight: bold; color: #007bff; }
-                .correct-answer { color: #28a745; font-weight: bold; }
-                .incorrect-answer { color: #dc3545; }
-                .comparison { background: #e8f5e8; padding: 10px; border-radius: 5px; margin: 10px 0; }
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>📊 Результаты опроса</h1>
-                <p>Практикум для воспитателей - {{ date }}</p>
-                <p>Участников: {{ total_participants }} | Ответов: {{ total_answers }}</p>
-            </div>
-
-            <div class="summary-grid">
-                <div class="summary-item">
-                    <div class="percentage">{{ total_participants }}</div>
-                    <div>Участников</div>
-                </div>
-                <div class="summary-item">
-                    <div class="percentage">{{ total_answers }}</div>
-                    <div>Всего ответов</div>
-                </div>
-                <div class="summary-item">
-                    <div class="percentage">{{ avg_correct_percent }}%</div>
-                    <div>Средний % правильных</div>
-                </div>
-                <div class="summary-item">
-                    <div class="percentage">{{ questions_count }}</div>
-                    <div>Вопросов</div>
-                </div>
-            </div>
-
-            <div class="stats-card">
-                <h2>📈 Общая статистика по вопросам</h2>
-                <div class="chart-container">
-                    <canvas id="overallChart"></canvas>
-                </div>
-            </div>
-
-            {% for i in range(questions_count) %}
-            <div class="stats-card">
-                <h3>Вопрос {{ i+1 }}</h3>
-                <div class="question-card">
-                    <p><strong>{{ questions[i] }}</strong></p>
-                    <p class="correct-answer">✅ Правильный ответ: {{ correct_answers[i] }}</p>
-                </div>
-                
-                <div class="comparison">
-                    <p><strong>Сравнение с эталоном:</strong></p>
-                    <p>Правильных ответов: {{ correct_counts[i] }} ({{ correct_percents[i] }}%)</p>
-                    <p>Неправильных ответов: {{ incorrect_counts[i] }} ({{ incorrect_percents[i] }}%)</p>
-                </div>
-                
-                <div class="chart-container">
-                    <canvas id="chart{{ i }}"></canvas>
-                </div>
-                <p><strong>Результаты:</strong> ✅ Да: {{ results[i].yes }} ({{ yes_percents[i] }}%) | ❌ Нет: {{ results[i].no }} ({{ no_percents[i] }}%)</p>
-            </div>
-            {% endfor %}
-
-            <script>
-                // Общая статистика
-                const overallCtx = document.getElementById('overallChart').getContext('2d');
-                new Chart(overallCtx, {
-                    type: 'bar',
-                    data: {
-                        labels: {{ question_numbers|tojson }},
-                        datasets: [
-                            {
-                                label: '✅ Да',
-                                data: {{ yes_data|tojson }},
-                                backgroundColor: '#28a745'
-                            },
-                            {
-                                label: '❌ Нет',
-                                data: {{ no_data|tojson }},
-                                backgroundColor: '#dc3545'
-                            }
-                        ]
-                    },
-                    options: {
-                        responsive: true,
-                        plugins: {
-                            title: {
-                                display: true,
-                                text: 'Распределение ответов по вопросам'
-                            }
-                        },
-                        scales: {
-                            x: {
-                                title: {
-                                    display: true,
-                                    text: 'Номер вопроса'
-                                }
-                            },
-                            y: {
-                                title: {
-                                    display: true,
-                                    text: 'Количество ответов'
-                                },
-                                beginAtZero: true
-                            }
-                        }
-                    }
-                });
-
-                // Графики для каждого вопроса
-                {% for i in range(questions_count) %}
-                const ctx{{ i }} = document.getElementById('chart{{ i }}').getContext('2d');
-                new Chart(ctx{{ i }}, {
-                    type: 'doughnut',
-                    data: {
-                        labels: ['✅ Да ({{ yes_percents[i] }}%)', '❌ Нет ({{ no_percents[i] }}%)'],
-                        datasets: [{
-                            data: [{{ results[i].yes }}, {{ results[i].no }}],
-                            backgroundColor: ['#28a745', '#dc3545']
-                        }]
-                    },
-                    options: {
-                        responsive: true,
-                        plugins: {
-                            legend: {
-                                position: 'bottom'
-                            },
-                            title: {
-                                display: true,
-                                text: 'Вопрос {{ i+1 }}'
-                            }
-                        }
-                    }
-                });
-                {% endfor %}
-            </script>
-        </body>
-        </html>
+    def export_to_parquet(self, row_group_size: int = PARQUET_ROW_GROUP_SIZE):
+        """Экспорт всех ответов (по строке на ответ) в колоночный формат Parquet.
+        
+        Строки собираются и пишутся группами по row_group_size, но готовый файл
+        целиком накапливается в памяти (BufferOutputStream) и возвращается
+        байтами. Требует пакет pyarrow.
         """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
         
-        total_answers = sum(sum(stats.values()) for stats in self.results.values())
-        total_participants = len(self.user_info)
+        schema = pa.schema([
+            ("user_id", pa.int64()),
+            ("username", pa.string()),
+            ("first_name", pa.string()),
+            ("question", pa.int16()),
+            ("answer", pa.dictionary(pa.int8(), pa.string())),
+            ("is_correct", pa.bool_()),
+            ("timestamp", pa.timestamp("us")),
+        ])
         
-        # Подготавливаем данные для графиков
-        question_numbers = [f"Вопрос {i+1}" for i in range(len(QUESTIONS))]
-        yes_data = [self.results[i]["yes"] for i in range(len(QUESTIONS))]
-        no_data = [self.results[i]["no"] for i in range(len(QUESTIONS))]
+        def new_columns():
+            return {name: [] for name in schema.names}
         
-        yes_percents = []
-        no_percents = []
-        correct_answers = []
-        correct_counts = []
-        incorrect_counts = []
-        correct_percents = []
-        incorrect_percents = []
+        def flush(writer, columns):
+            columns["answer"] = pa.array(columns["answer"], pa.string()).dictionary_encode()
+            writer.write_table(pa.table(columns, schema=schema), row_group_size=row_group_size)
         
-        total_correct_percent = 0
+        sink = pa.BufferOutputStream()
+        with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+            columns = new_columns()
+            rows = 0
+            for user_id, info, answers in self.iter_users():
+                for question_id, details in answers.items():
+                    answer = details["answer"]
+                    columns["user_id"].append(user_id)
+                    columns["username"].append(info.get("username") or "")
+                    columns["first_name"].append(info.get("first_name") or "")
+                    columns["question"].append(question_id + 1)
+                    columns["answer"].append(answer)
+                    columns["is_correct"].append(CORRECT_ANSWERS.get(question_id) == answer)
+                    columns["timestamp"].append(datetime.fromisoformat(details["timestamp"]))
+                    rows += 1
+                    if rows % row_group_size == 0:
+                        flush(writer, columns)
+                        columns = new_columns()
+            if columns["user_id"] or rows == 0:
+                flush(writer, columns)
+        
+        return sink.getvalue().to_pybytes()
+    
+    def export_to_html_report(self):
+        """Создание HTML отчета с графиками.
+        
+        Карточки вопросов берутся из кэша фрагментов (пересобираются только
+        при изменении счетчиков вопроса), данные для графиков передаются одним
+        JSON-блоком, а скрипт и стили отдаются самим приложением из static/.
+        """
+        total_answers = sum(sum(stats.values()) for stats in self.results.values())
+        total_participants = self.participants_count()
         
+        fragments = []
+        questions_data = []
+        total_correct_percent = 0
         for i in range(len(QUESTIONS)):
             stats = self.results[i]
-            total = stats["yes"] + stats["no"]
-            yes_percent = (stats["yes"] / total * 100) if total > 0 else 0
-            no_percent = (stats["no"] / total * 100) if total > 0 else 0
-            
-            yes_percents.append(f"{yes_percent:.1f}")
-            no_percents.append(f"{no_percent:.1f}")
-            
-            # Определяем правильный ответ и статистику
-            correct_answer_text = "Да" if CORRECT_ANSWERS[i] == "yes" else "Нет"
-            correct_answers.append(correct_answer_text)
-            
-            correct_count = stats["yes"] if CORRECT_ANSWERS[i] == "yes" else stats["no"]
-            incorrect_count = total - correct_count
-            correct_percent = (correct_count / total * 100) if total > 0 else 0
-            incorrect_percent = (incorrect_count / total * 100) if total > 0 else 0
-            
-            correct_counts.append(correct_count)
-            incorrect_counts.append(incorrect_count)
-            correct_percents.append(f"{correct_percent:.1f}")
-            incorrect_percents.append(f"{incorrect_percent:.1f}")
-            
+            fragment, data, correct_percent = render_question_fragment(i, stats["yes"], stats["no"])
+            fragments.append(fragment)
+            questions_data.append(data)
             total_correct_percent += correct_percent
         
         # Средний процент правильных ответов
         avg_correct_percent = total_correct_percent / len(QUESTIONS) if len(QUESTIONS) > 0 else 0
         
-        return render_template_string(
-            html_template,
-            date=datetime.now().strftime("%d.%m.%Y %H:%M"),
-            total_participants=total_participants,
-            total_answers=total_answers,
-            avg_correct_percent=f"{avg_correct_percent:.1f}",
-            questions_count=len(QUESTIONS),
-            questions=QUESTIONS,
-            results=self.results,
-            question_numbers=question_numbers,
-            yes_data=yes_data,
-            no_data=no_data,
-            yes_percents=yes_percents,
-            no_percents=no_percents,
-            correct_answers=correct_answers,
-            correct_counts=correct_counts,
-            incorrect_counts=incorrect_counts,
-            correct_percents=correct_percents,
-            incorrect_percents=incorrect_percents
-        )
+        # "</" экранируется, чтобы текст вопросов не мог закрыть тег <script>
+        report_data = json.dumps({"questions": questions_data}, ensure_ascii=False).replace("</", "<\\/")
+        
+        return f"""<!DOCTYPE html>
+<html>
+<head>
+    <title>Результаты опроса - Практикум для воспитателей</title>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <link rel="stylesheet" href="{static_asset_url('report.css')}">
+    <script src="{static_asset_url('report.js')}" defer></script>
+</head>
+<body>
+    <div class="header">
+        <h1>📊 Результаты опроса</h1>
+        <p>Практикум для воспитателей - {datetime.now().strftime("%d.%m.%Y %H:%M")}</p>
+        <p>Участников: {total_participants} | Ответов: {total_answers}</p>
+    </div>
+
+    <div class="summary-grid">
+        <div class="summary-item">
+            <div class="percentage">{total_participants}</div>
+            <div>Участников</div>
+        </div>
+        <div class="summary-item">
+            <div class="percentage">{total_answers}</div>
+            <div>Всего ответов</div>
+        </div>
+        <div class="summary-item">
+            <div class="percentage">{avg_correct_percent:.1f}%</div>
+            <div>Средний % правильных</div>
+        </div>
+        <div class="summary-item">
+            <div class="percentage">{len(QUESTIONS)}</div>
+            <div>Вопросов</div>
+        </div>
+    </div>
+
+    <div class="stats-card">
+        <h2>📈 Общая статистика по вопросам</h2>
+        <div class="chart-container">
+            <canvas id="overallChart"></canvas>
+        </div>
+    </div>
+{"".join(fragments)}
+{render_analytics_fragment(survey_analytics.latest)}
+    <script id="report-data" type="application/json">{report_data}</script>
+</body>
+</html>
+"""
     
     def export_to_text_report(self):
         """Создание текстового отчета для отправки в Telegram"""
+        return "".join(self.export_to_text_sections())
+    
+    def export_to_text_sections(self):
+        """Текстовый отчет, разбитый на разделы: заголовок, вопросы, итог"""
         total_answers = sum(sum(stats.values()) for stats in self.results.values())
-        total_participants = len(self.user_info)
+        total_participants = self.participants_count()
+        sections = []
         
         text = f"📊 ДЕТАЛЬНЫЙ ОТЧЕТ ОПРОСА С ЭТАЛОННЫМИ ОТВЕТАМИ\n"
         text += f"Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}\n"
         text += f"Участников: {total_participants}\n"
         text += f"Всего ответов: {total_answers}\n"
         text += f"Вопросов: {len(QUESTIONS)}\n\n"
+        sections.append(text)
         
         total_correct_percent = 0
         
@@ -418,7 +873,7 @@ class ResultsStorage:
             else:
                 success_icon = "⚠️"
             
-            text += f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+            text = f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
             text += f"ВОПРОС {i+1} {success_icon}\n"
             text += f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
             text += f"{question}\n\n"
@@ -428,6 +883,7 @@ class ResultsStorage:
             text += f"   👥 Всего ответов: {total}\n\n"
             text += f"🎯 Эталонный ответ: {correct_answer}\n"
             text += f"📗 Правильных ответов: {correct_count} ({correct_percent:.1f}%)\n\n"
+            sections.append(text)
         
         # Средний процент правильных ответов
         avg_correct_percent = total_correct_percent / len(QUESTIONS) if len(QUESTIONS) > 0 else 0
@@ -446,22 +902,859 @@ class ResultsStorage:
             overall_rating = "НИЗКИЙ РЕЗУЛЬТАТ"
             rating_icon = "📉"
         
-        text += f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+        text = f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
         text += f"📈 ИТОГОВАЯ СТАТИСТИКА {rating_icon}\n"
         text += f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
         text += f"Средний процент правильных ответов: {avg_correct_percent:.1f}%\n"
         text += f"Общая оценка: {overall_rating}\n"
+        sections.append(text)
         
-        return text
+        return sections
+
+class AuditLog:
+    """Журнал всех голосов только на дозапись, в компактном двоичном виде.
+    
+    Каждое событие - запись фиксированного размера 14 байт (struct "<IqBB"):
+    время (сек.), user_id, номер вопроса, событие и ответ в одном байте.
+    Для текущего файла в памяти держатся индексы номеров записей по
+    пользователю и по вопросу (array, 4 байта на запись). При превышении
+    размера файл ротируется; старые файлы и файлы других шардов
+    просматриваются последовательно блоками, от старых к новым.
+    """
+    
+    ACCEPTED = 0          # Первый ответ на вопрос
+    CHANGED = 1           # Ответ изменен
+    DUPLICATE = 2         # Повторный такой же ответ
+    REJECTED_ADMIN = 3    # Голос администратора отклонен
+    REJECTED_INVALID = 4  # Некорректный вопрос или ответ
+    
+    EVENT_NAMES = {
+        ACCEPTED: "ответ",
+        CHANGED: "изменение",
+        DUPLICATE: "повтор",
+        REJECTED_ADMIN: "отклонен (админ)",
+        REJECTED_INVALID: "отклонен (некорректный)",
+    }
+    ANSWER_CODES = {"yes": 1, "no": 2}
+    ANSWER_NAMES = {0: "?", 1: "yes", 2: "no"}
+    
+    MAGIC = b"SVAUDIT1"
+    RECORD = struct.Struct("<IqBB")
+    NO_QUESTION = 255
+    SCAN_BLOCK_RECORDS = 4096  # Сколько записей читать за раз при просмотре старых файлов
+    
+    def __init__(self, path: str, max_bytes: int = AUDIT_MAX_BYTES, backup_count: int = AUDIT_BACKUP_COUNT,
+                 base_path: str = None):
+        self.path = path
+        self.base_path = base_path or path  # Общий префикс файлов (все шарды и старые файлы)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._open()
+    
+    def _open(self):
+        """Открывает текущий файл и строит индексы по уже записанным событиям"""
+        self.by_user = {}
+        self.by_question = {}
+        self.records = 0
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= len(self.MAGIC):
+            with open(self.path, "rb") as file:
+                data = file.read()
+            if data[:len(self.MAGIC)] != self.MAGIC:
+                raise ValueError(f"{self.path} не является журналом голосов")
+            body = data[len(self.MAGIC):]
+            # Недописанная при сбое последняя запись отбрасывается
+            complete = len(body) - len(body) % self.RECORD.size
+            for record_number, (_, user_id, question_id, _) in enumerate(self.RECORD.iter_unpack(body[:complete])):
+                self._index(record_number, user_id, question_id)
+            self.records = complete // self.RECORD.size
+            self.file = open(self.path, "r+b")
+            self.file.truncate(len(self.MAGIC) + complete)
+            self.file.seek(0, os.SEEK_END)
+        else:
+            self.file = open(self.path, "wb")
+            self.file.write(self.MAGIC)
+            self.file.flush()
+    
+    def _index(self, record_number: int, user_id: int, question_id: int):
+        self.by_user.setdefault(user_id, array("I")).append(record_number)
+        self.by_question.setdefault(question_id, array("I")).append(record_number)
+    
+    def append(self, user_id: int, question_id, event: int, answer):
+        """Добавляет событие в журнал"""
+        if not isinstance(question_id, int) or not 0 <= question_id < self.NO_QUESTION:
+            question_id = self.NO_QUESTION
+        flags = (event << 2) | self.ANSWER_CODES.get(answer, 0)
+        if len(self.MAGIC) + (self.records + 1) * self.RECORD.size > self.max_bytes:
+            self.rotate()
+        self.file.write(self.RECORD.pack(int(time.time()), user_id, question_id, flags))
+        self.file.flush()
+        self._index(self.records, user_id, question_id)
+        self.records += 1
+    
+    def rotate(self):
+        """Переименовывает текущий файл в .1 (старые сдвигаются) и начинает новый"""
+        self.file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+    
+    def close(self):
+        self.file.close()
+    
+    def _decode(self, record):
+        timestamp, user_id, question_id, flags = record
+        return {
+            "time": datetime.fromtimestamp(timestamp),
+            "user_id": user_id,
+            "question_id": None if question_id == self.NO_QUESTION else question_id,
+            "event": flags >> 2,
+            "answer": self.ANSWER_NAMES.get(flags & 0b11, "?"),
+        }
+    
+    def _journal_files(self):
+        """Файлы журнала по группам (журнал шарда и его старые копии) от старых к новым.
+        
+        У копий номер в конце имени: .1 - самая свежая, больший номер - более старая.
+        """
+        import glob
+        groups = {}
+        for path in glob.glob(f"{glob.escape(self.base_path)}*"):
+            if path.endswith(".tmp"):
+                continue
+            head, _, suffix = path.rpartition(".")
+            if head and suffix.isdigit():
+                groups.setdefault(head, []).append((int(suffix), path))
+            else:
+                groups.setdefault(path, []).append((0, path))
+        return [[path for _, path in sorted(files, reverse=True)] for files in groups.values()]
+    
+    def _scan_file(self, path: str, user_id, question_id):
+        """Последовательный просмотр файла журнала блоками (без чтения целиком в память)"""
+        try:
+            file = open(path, "rb")
+        except OSError:
+            return
+        with file:
+            if file.read(len(self.MAGIC)) != self.MAGIC:
+                return
+            block_size = self.SCAN_BLOCK_RECORDS * self.RECORD.size
+            while True:
+                block = file.read(block_size)
+                block = block[:len(block) - len(block) % self.RECORD.size]
+                if not block:
+                    break
+                for record in self.RECORD.iter_unpack(block):
+                    if (user_id is None or record[1] == user_id) and (question_id is None or record[2] == question_id):
+                        yield record
+    
+    def _read_current(self, candidates, question_id):
+        """Записи текущего файла по индексу"""
+        with open(self.path, "rb") as file:
+            for record_number in candidates:
+                file.seek(len(self.MAGIC) + record_number * self.RECORD.size)
+                data = file.read(self.RECORD.size)
+                if len(data) < self.RECORD.size:
+                    # Файл ротирован во время запроса
+                    break
+                record = self.RECORD.unpack(data)
+                if question_id is None or record[2] == question_id:
+                    yield record
+    
+    def query(self, user_id: int = None, question_id: int = None, limit: int = 50):
+        """Последние события по пользователю и/или вопросу (старые - первыми).
+        
+        Просматривает все файлы журнала, поэтому из цикла событий вызывается в потоке.
+        Время записей - с точностью до секунды, поэтому внутри одного журнала
+        порядок берется из файлов, а журналы разных шардов сливаются по времени.
+        """
+        if user_id is not None:
+            candidates = array("I", self.by_user.get(user_id, array("I")))
+        elif question_id is not None:
+            candidates = array("I", self.by_question.get(question_id, array("I")))
+        else:
+            candidates = range(self.records)
+        
+        import heapq
+        streams = []
+        for paths in self._journal_files():
+            # Из каждого журнала нужны только последние limit событий
+            stream = deque(maxlen=limit)
+            for path in paths:
+                if path == self.path:
+                    stream.extend(self._read_current(candidates, question_id))
+                else:
+                    stream.extend(self._scan_file(path, user_id, question_id))
+            streams.append(stream)
+        
+        records = list(heapq.merge(*streams, key=lambda record: record[0]))
+        return [self._decode(record) for record in records[-limit:]]
+
+class SurveyAnalytics:
+    """Аналитика по вопросам на упакованной матрице ответов пользователь × вопрос.
+    
+    Матрица int8 (1 - "да", -1 - "нет", 0 - нет ответа) обновляется
+    инкрементально: перезаписываются только строки изменившихся пользователей.
+    Сами показатели считаются векторно (numpy) в отдельном потоке:
+    - трудность вопроса - доля правильных ответов;
+    - различающая способность - разница доли правильных у 27% лучших и 27% худших
+      участников и корреляция вопроса с суммой остальных (по прошедшим весь опрос);
+    - согласованность вопросов - доля участников, ответивших на оба вопроса
+      одинаково верно или одинаково неверно;
+    - когорты по дню первого ответа.
+    """
+    
+    def __init__(self):
+        self.rows = {}        # user_id -> номер строки матрицы
+        self.matrix = None
+        self.joined = None    # День первого ответа (порядковый номер даты) по строкам
+        self.count = 0
+        self.latest = None    # Последний рассчитанный результат
+    
+    def _reset(self, np, capacity: int = 1024):
+        self.rows = {}
+        self.matrix = np.zeros((capacity, len(QUESTIONS)), dtype=np.int8)
+        self.joined = np.zeros(capacity, dtype=np.int32)
+        self.count = 0
+    
+    def _set_row(self, np, user_id: int, info: dict, answers: dict):
+        row = self.rows.get(user_id)
+        if row is None:
+            if self.count == len(self.matrix):
+                # Матрица заполнена - увеличиваем вдвое
+                self.matrix = np.concatenate([self.matrix, np.zeros_like(self.matrix)])
+                self.joined = np.concatenate([self.joined, np.zeros_like(self.joined)])
+            row = self.rows[user_id] = self.count
+            self.count += 1
+        values = self.matrix[row]
+        values[:] = 0
+        for question_id, details in answers.items():
+            if question_id < len(values):
+                values[question_id] = 1 if details["answer"] == "yes" else -1
+        joined = info.get("joined") or min((details["timestamp"] for details in answers.values()), default=None)
+        self.joined[row] = datetime.fromisoformat(joined).toordinal() if joined else 0
+    
+    def update(self, storage):
+        """Переносит изменения хранилища в матрицу и возвращает ее снимок для расчета"""
+        import numpy as np
+        
+        full = (storage is not results_storage or storage.analytics_dirty_all or self.matrix is None
+                or self.matrix.shape[1] != len(QUESTIONS))
+        if full:
+            self._reset(np)
+            for user_id, info, answers in storage.iter_users():
+                self._set_row(np, user_id, info, answers)
+        else:
+            for user_id in storage.analytics_dirty:
+                if user_id in storage.user_info:
+                    self._set_row(np, user_id, storage.user_info[user_id], storage.user_answers.get(user_id, {}))
+                elif storage.archive is not None:
+                    record = storage.archive.get(user_id)
+                    if record is not None:
+                        self._set_row(np, user_id, *record)
+        storage.analytics_dirty = set()
+        storage.analytics_dirty_all = False
+        return self.matrix[:self.count].copy(), self.joined[:self.count].copy()
+    
+    @staticmethod
+    def compute(matrix, joined, correct_answers):
+        """Расчет показателей (без обращения к общему состоянию - выполняется в потоке)"""
+        import numpy as np
+        
+        questions_count = matrix.shape[1]
+        key = np.array([1 if correct_answers[i] == "yes" else -1 for i in range(questions_count)], dtype=np.int8)
+        answered = matrix != 0
+        correct = (matrix == key) & answered
+        answered_f = answered.astype(np.float64)
+        correct_f = correct.astype(np.float64)
+        incorrect_f = answered_f - correct_f
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Трудность: доля правильных ответов по каждому вопросу
+            answered_count = answered_f.sum(axis=0)
+            difficulty = correct_f.sum(axis=0) / answered_count
+            
+            # Согласованность: среди ответивших на оба вопроса - доля одинаково верных/неверных
+            both = answered_f.T @ answered_f
+            agreement = (correct_f.T @ correct_f + incorrect_f.T @ incorrect_f) / both
+            
+            # Различающая способность - по участникам, прошедшим весь опрос
+            complete = answered.all(axis=1)
+            scores = correct_f[complete]
+            discrimination = np.full(questions_count, np.nan)
+            item_rest = np.full(questions_count, np.nan)
+            if len(scores) >= 4:
+                totals = scores.sum(axis=1)
+                order = np.argsort(totals, kind="stable")
+                group = max(1, int(round(len(scores) * 0.27)))
+                discrimination = scores[order[-group:]].mean(axis=0) - scores[order[:group]].mean(axis=0)
+                
+                rest = totals[:, None] - scores
+                items_centered = scores - scores.mean(axis=0)
+                rest_centered = rest - rest.mean(axis=0)
+                item_rest = (items_centered * rest_centered).sum(axis=0) / np.sqrt(
+                    (items_centered ** 2).sum(axis=0) * (rest_centered ** 2).sum(axis=0)
+                )
+            
+            # Когорты по дню первого ответа
+            cohorts = []
+            has_join = joined > 0
+            if has_join.any():
+                unique_days, cohort_index = np.unique(joined[has_join], return_inverse=True)
+                users = np.bincount(cohort_index)
+                user_correct = correct_f[has_join].sum(axis=1)
+                user_answered = answered_f[has_join].sum(axis=1)
+                cohort_correct = np.bincount(cohort_index, weights=user_correct)
+                cohort_answered = np.bincount(cohort_index, weights=user_answered)
+                cohort_complete = np.bincount(cohort_index, weights=complete[has_join].astype(np.float64))
+                for i, day in enumerate(unique_days):
+                    cohorts.append({
+                        "label": datetime.fromordinal(int(day)).strftime("%d.%m.%Y"),
+                        "users": int(users[i]),
+                        "correct_percent": float(cohort_correct[i] / cohort_answered[i] * 100) if cohort_answered[i] else None,
+                        "completion_percent": float(cohort_complete[i] / users[i] * 100),
+                    })
+        
+        def to_list(values):
+            return [None if np.isnan(value) else round(float(value), 3) for value in values]
+        
+        return {
+            "computed_at": datetime.now(),
+            "users": int(matrix.shape[0]),
+            "complete_users": int(complete.sum()),
+            "difficulty": to_list(difficulty),
+            "discrimination": to_list(discrimination),
+            "item_rest": to_list(item_rest),
+            "agreement": [to_list(row) for row in agreement],
+            "cohorts": cohorts,
+        }
+    
+    async def refresh(self, storage):
+        """Инкрементально обновляет матрицу и пересчитывает показатели в потоке"""
+        matrix, joined = self.update(storage)
+        loop = asyncio.get_running_loop()
+        self.latest = await loop.run_in_executor(None, self.compute, matrix, joined, dict(CORRECT_ANSWERS))
+        return self.latest
+
+survey_analytics = SurveyAnalytics()
+
+def analytics_text(analytics):
+    """Краткая сводка аналитики для админ-панели"""
+    text = (
+        f"🔬 <b>Аналитика</b> (обновлено {analytics['computed_at'].strftime('%H:%M')})\n"
+        f"Участников: {analytics['users']}, прошли весь опрос: {analytics['complete_users']}\n\n"
+        "<b>Вопросы</b> (правильных / различение D / корреляция с остальными):\n"
+    )
+    for i, difficulty in enumerate(analytics["difficulty"]):
+        discrimination = analytics["discrimination"][i]
+        item_rest = analytics["item_rest"][i]
+        text += (
+            f"{i + 1}. {difficulty * 100:.0f}%" if difficulty is not None else f"{i + 1}. —"
+        ) + (
+            f" / D={discrimination:.2f}" if discrimination is not None else " / D=—"
+        ) + (
+            f" / r={item_rest:.2f}\n" if item_rest is not None else " / r=—\n"
+        )
+    
+    # Самая согласованная и самая несогласованная пары вопросов
+    pairs = [
+        (value, i, j)
+        for i, row in enumerate(analytics["agreement"])
+        for j, value in enumerate(row)
+        if i < j and value is not None
+    ]
+    if pairs:
+        best = max(pairs)
+        worst = min(pairs)
+        text += (
+            f"\n<b>Согласованность вопросов:</b>\n"
+            f"• максимальная: {best[1] + 1} и {best[2] + 1} ({best[0] * 100:.0f}%)\n"
+            f"• минимальная: {worst[1] + 1} и {worst[2] + 1} ({worst[0] * 100:.0f}%)\n"
+        )
+    
+    if analytics["cohorts"]:
+        text += "\n<b>Когорты по дню начала:</b>\n"
+        for cohort in analytics["cohorts"][-10:]:
+            correct = f"{cohort['correct_percent']:.0f}%" if cohort["correct_percent"] is not None else "—"
+            text += f"• {cohort['label']}: {cohort['users']} уч., правильных {correct}, завершили {cohort['completion_percent']:.0f}%\n"
+    return text
+
+_analytics_fragment = (None, "")
+
+def render_analytics_fragment(analytics):
+    """Раздел аналитики для HTML-отчета (пересобирается только после нового расчета)"""
+    global _analytics_fragment
+    if analytics is None:
+        return ""
+    if _analytics_fragment[0] is analytics:
+        return _analytics_fragment[1]
+    
+    def percent(value):
+        return f"{value * 100:.0f}%" if value is not None else "—"
+    
+    def number(value):
+        return f"{value:.2f}" if value is not None else "—"
+    
+    rows = "".join(
+        f"<tr><td>Вопрос {i + 1}</td><td>{percent(difficulty)}</td>"
+        f"<td>{number(analytics['discrimination'][i])}</td><td>{number(analytics['item_rest'][i])}</td></tr>"
+        for i, difficulty in enumerate(analytics["difficulty"])
+    )
+    header_cells = "".join(f"<th>{i + 1}</th>" for i in range(len(analytics["agreement"])))
+    matrix_rows = ""
+    for i, row in enumerate(analytics["agreement"]):
+        cells = ""
+        for value in row:
+            # Чем выше согласованность, тем насыщеннее цвет ячейки
+            alpha = f"{value:.2f}" if value is not None else "0"
+            cells += f'<td style="background: rgba(0, 123, 255, {alpha})">{percent(value)}</td>'
+        matrix_rows += f"<tr><th>{i + 1}</th>{cells}</tr>"
+    cohort_rows = "".join(
+        f"<tr><td>{cohort['label']}</td><td>{cohort['users']}</td>"
+        f"<td>{percent(cohort['correct_percent'] / 100 if cohort['correct_percent'] is not None else None)}</td>"
+        f"<td>{cohort['completion_percent']:.0f}%</td></tr>"
+        for cohort in analytics["cohorts"]
+    )
+    
+    fragment = f"""
+    <div class="stats-card">
+        <h2>🔬 Аналитика</h2>
+        <p>Обновлено: {analytics['computed_at'].strftime('%d.%m.%Y %H:%M')} |
+           Участников: {analytics['users']} | Прошли весь опрос: {analytics['complete_users']}</p>
+        <h3>Трудность и различающая способность вопросов</h3>
+        <table class="analytics-table">
+            <tr><th>Вопрос</th><th>Правильных</th><th>Различение D</th><th>Корреляция с остальными</th></tr>
+            {rows}
+        </table>
+        <h3>Согласованность вопросов</h3>
+        <p>Доля участников, ответивших на оба вопроса одинаково верно или одинаково неверно.</p>
+        <table class="analytics-table">
+            <tr><th></th>{header_cells}</tr>
+            {matrix_rows}
+        </table>
+        <h3>Когорты по дню начала</h3>
+        <table class="analytics-table">
+            <tr><th>День</th><th>Участников</th><th>Правильных</th><th>Завершили</th></tr>
+            {cohort_rows}
+        </table>
+    </div>
+"""
+    _analytics_fragment = (analytics, fragment)
+    return fragment
+
+async def analytics_loop():
+    """Периодически пересчитывает аналитику, если результаты изменились.
+    
+    В шардированном режиме запускается только в маршрутизаторе: сводная база
+    читается в потоке и лишь после изменения ее ревизии, а результат
+    сохраняется в базу для админ-панели процессов-обработчиков.
+    """
+    loop = asyncio.get_running_loop()
+    seen_version = None
+    while True:
+        aggregator = results_storage.aggregator
+        try:
+            if aggregator is not None:
+                revision = await loop.run_in_executor(None, aggregator.revision)
+                if revision != seen_version:
+                    storage = await loop.run_in_executor(None, aggregator.load_merged)
+                    analytics = await survey_analytics.refresh(storage)
+                    await loop.run_in_executor(None, aggregator.save_analytics, analytics)
+                    seen_version = revision
+            elif results_storage.version != seen_version:
+                seen_version = results_storage.version
+                await survey_analytics.refresh(results_storage)
+        except ImportError:
+            logging.warning("Аналитика отключена: не установлен пакет numpy")
+            return
+        except Exception as e:
+            logging.error(f"Error computing analytics: {e}")
+        await asyncio.sleep(ANALYTICS_INTERVAL)
+
+async def load_latest_analytics():
+    """Последняя рассчитанная аналитика (в процессах-обработчиках - из сводной базы)"""
+    if results_storage.aggregator is not None:
+        return await asyncio.get_running_loop().run_in_executor(None, results_storage.aggregator.load_analytics)
+    return survey_analytics.latest
+
+class SQLiteStore:
+    """Базовый класс для хранилищ на SQLite с отдельным соединением на поток"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+    
+    def _connection(self):
+        """Отдельное соединение на каждый поток (Flask и бот работают в разных потоках)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            import sqlite3
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+class UserArchive(SQLiteStore):
+    """Архив участников, выгруженных из памяти (информация и ответы в JSON)"""
+    
+    def __init__(self, path: str):
+        super().__init__(path)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS archived_users ("
+                "user_id INTEGER PRIMARY KEY, info TEXT NOT NULL, answers TEXT NOT NULL)"
+            )
+    
+    def save_many(self, records):
+        """Сохраняет участников: последовательность (user_id, info, answers)"""
+        rows = [
+            (user_id, json.dumps(info, ensure_ascii=False),
+             json.dumps({str(question_id): details for question_id, details in answers.items()}, ensure_ascii=False))
+            for user_id, info, answers in records
+        ]
+        conn = self._connection()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO archived_users (user_id, info, answers) VALUES (?, ?, ?)", rows)
+    
+    def delete_many(self, user_ids):
+        conn = self._connection()
+        with conn:
+            conn.executemany("DELETE FROM archived_users WHERE user_id = ?", [(user_id,) for user_id in user_ids])
+    
+    def ids(self):
+        return {row[0] for row in self._connection().execute("SELECT user_id FROM archived_users")}
+    
+    def get(self, user_id: int):
+        """Читает участника из архива, не удаляя его, или возвращает None"""
+        row = self._connection().execute(
+            "SELECT info, answers FROM archived_users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return self._decode(row[0], row[1]) if row is not None else None
+    
+    def iter_all(self):
+        """Перебирает всех участников архива: (user_id, info, answers)"""
+        for user_id, info, answers in self._connection().execute("SELECT user_id, info, answers FROM archived_users"):
+            yield (user_id,) + self._decode(info, answers)
+    
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM archived_users").fetchone()[0]
+    
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM archived_users")
+    
+    @staticmethod
+    def _decode(info, answers):
+        return json.loads(info), {int(question_id): details for question_id, details in json.loads(answers).items()}
+
+class SharedAggregator(SQLiteStore):
+    """Общий слой агрегации результатов для шардированного режима.
+    
+    Каждый процесс-обработчик хранит прогресс только своих пользователей,
+    а счетчики по вопросам и ответы пишет в общую базу SQLite. Экспорт
+    строится по сводному представлению из этой базы.
+    """
+    
+    def __init__(self, path: str):
+        super().__init__(path)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                "question_id INTEGER NOT NULL, answer TEXT NOT NULL, count INTEGER NOT NULL, "
+                "PRIMARY KEY (question_id, answer))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                "user_id INTEGER PRIMARY KEY, username TEXT, first_name TEXT, last_active TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "user_id INTEGER NOT NULL, question_id INTEGER NOT NULL, answer TEXT NOT NULL, timestamp TEXT, "
+                "PRIMARY KEY (user_id, question_id))"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', 0)")
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0)")
+            conn.execute("CREATE TABLE IF NOT EXISTS analytics (id INTEGER PRIMARY KEY CHECK (id = 1), payload TEXT NOT NULL)")
+    
+    def record_vote(self, question_id: int, answer: str, user_id: int, info: dict, timestamp: str):
+        """Записывает голос в общую базу одной транзакцией"""
+        self.record_votes_batch([
+            (user_id, info.get("username", ""), info.get("first_name", ""), question_id, answer, timestamp)
+        ])
+    
+    def record_votes_batch(self, votes):
+        """Записывает пакет голосов (user_id, username, first_name, question_id, answer, timestamp).
+        
+        Счетчики меняются только при новом или измененном ответе: повторный голос
+        и голос старше уже записанного ответа не учитываются. Возвращает число
+        учтенных голосов.
+        """
+        applied = 0
+        counters = {}
+        users = {}
+        conn = self._connection()
+        with conn:
+            for user_id, username, first_name, question_id, answer, timestamp in votes:
+                row = conn.execute(
+                    "SELECT answer, timestamp FROM answers WHERE user_id = ? AND question_id = ?",
+                    (user_id, question_id)
+                ).fetchone()
+                if row is not None:
+                    if row[0] == answer or (row[1] or "") > timestamp:
+                        continue
+                    counters[(question_id, row[0])] = counters.get((question_id, row[0]), 0) - 1
+                counters[(question_id, answer)] = counters.get((question_id, answer), 0) + 1
+                applied += 1
+                conn.execute(
+                    "INSERT INTO answers (user_id, question_id, answer, timestamp) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (user_id, question_id) DO UPDATE SET answer = excluded.answer, timestamp = excluded.timestamp",
+                    (user_id, question_id, answer, timestamp)
+                )
+                if user_id not in users or timestamp > users[user_id][3]:
+                    users[user_id] = (user_id, username, first_name, timestamp)
+            
+            conn.executemany(
+                "INSERT INTO counters (question_id, answer, count) VALUES (?, ?, ?) "
+                "ON CONFLICT (question_id, answer) DO UPDATE SET count = count + excluded.count",
+                [(question_id, answer, count) for (question_id, answer), count in counters.items()]
+            )
+            conn.executemany(
+                "INSERT INTO users (user_id, username, first_name, last_active) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET last_active = MAX(last_active, excluded.last_active)",
+                list(users.values())
+            )
+            if applied:
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+        return applied
+    
+    def load_partition(self, storage, shard_index: int, shard_count: int):
+        """Загружает в хранилище прогресс пользователей, принадлежащих шарду"""
+        conn = self._connection()
+        users = {}
+        for user_id, username, first_name, last_active in conn.execute(
+                "SELECT user_id, username, first_name, last_active FROM users"):
+            if shard_for_user(user_id, shard_count) == shard_index:
+                users[user_id] = (username, first_name)
+        votes = [
+            (user_id, users[user_id][0], users[user_id][1], question_id, answer, timestamp)
+            for user_id, question_id, answer, timestamp in conn.execute(
+                "SELECT user_id, question_id, answer, timestamp FROM answers ORDER BY timestamp")
+            if user_id in users
+        ]
+        # Голоса уже есть в общей базе - загружаем их только локально
+        aggregator, storage.aggregator = storage.aggregator, None
+        try:
+            storage.add_votes_batch(votes)
+        finally:
+            storage.aggregator = aggregator
+        return len(votes)
+    
+    def epoch(self) -> int:
+        """Номер "поколения" результатов, увеличивается при каждом сбросе"""
+        row = self._connection().execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()
+        return row[0] if row else 0
+    
+    def revision(self) -> int:
+        """Номер изменения сводных результатов (растет при каждой записи голосов и сбросе)"""
+        row = self._connection().execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        return row[0] if row else 0
+    
+    def save_analytics(self, analytics: dict):
+        """Сохраняет результат аналитики для всех процессов"""
+        payload = json.dumps({**analytics, "computed_at": analytics["computed_at"].isoformat()}, ensure_ascii=False)
+        conn = self._connection()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO analytics (id, payload) VALUES (1, ?)", (payload,))
+    
+    def load_analytics(self):
+        row = self._connection().execute("SELECT payload FROM analytics WHERE id = 1").fetchone()
+        if row is None:
+            return None
+        analytics = json.loads(row[0])
+        analytics["computed_at"] = datetime.fromisoformat(analytics["computed_at"])
+        return analytics
+    
+    def reset(self):
+        """Сбрасывает сводные результаты во всех шардах"""
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM counters")
+            conn.execute("DELETE FROM users")
+            conn.execute("DELETE FROM answers")
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key IN ('epoch', 'revision')")
+    
+    def load_totals(self):
+        """Только счетчики по вопросам и число участников (без чтения ответов)"""
+        totals = ResultsStorage()
+        conn = self._connection()
+        for question_id, answer, count in conn.execute("SELECT question_id, answer, count FROM counters"):
+            if question_id in totals.results and answer in totals.results[question_id]:
+                totals.results[question_id][answer] = count
+        totals.participants_total = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        return totals
+    
+    def load_merged(self):
+        """Собирает сводное хранилище результатов по всем шардам (только для чтения)"""
+        merged = ResultsStorage()
+        conn = self._connection()
+        for question_id, answer, count in conn.execute("SELECT question_id, answer, count FROM counters"):
+            if question_id in merged.results and answer in merged.results[question_id]:
+                merged.results[question_id][answer] = count
+        for user_id, username, first_name, last_active in conn.execute(
+                "SELECT user_id, username, first_name, last_active FROM users"):
+            merged.user_info[user_id] = {
+                "username": username,
+                "first_name": first_name,
+                "last_active": last_active
+            }
+            merged.user_progress[user_id] = {}
+            merged.user_answers[user_id] = {}
+        for user_id, question_id, answer, timestamp in conn.execute(
+                "SELECT user_id, question_id, answer, timestamp FROM answers"):
+            merged.user_progress.setdefault(user_id, {})[question_id] = answer
+            merged.user_answers.setdefault(user_id, {})[question_id] = {
+                "answer": answer,
+                "timestamp": timestamp
+            }
+        return merged
+
+# Допустимые варианты записи ответов в импортируемых файлах
+IMPORT_ANSWER_ALIASES = {"да": "yes", "нет": "no", "✅ да": "yes", "❌ нет": "no"}
+IMPORT_BATCH_SIZE = 5000
+
+def parse_vote_timestamp(value) -> str:
+    """Проверяет время голоса из файла и приводит его к формату isoformat (местное время).
+    
+    Принимает строку ISO 8601 или число (unix time); иначе - ValueError/TypeError.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        moment = datetime.fromtimestamp(value)
+    else:
+        moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment.isoformat()
+
+def parse_votes_csv(file):
+    """Читает голоса из раздела "Answers" файла, созданного export_to_csv.
+    
+    Некорректные строки возвращаются как None, чтобы импорт мог их посчитать.
+    """
+    import csv
+    in_answers = False
+    header_skipped = False
+    for row in csv.reader(file):
+        if not in_answers:
+            in_answers = row == ["Answers"]
+            continue
+        if not header_skipped:
+            header_skipped = True
+            continue
+        if not row:
+            break
+        try:
+            user_id, username, first_name, question_number, answer, timestamp = row[:6]
+            yield (int(user_id), username, first_name, int(question_number.lstrip("Qq")) - 1,
+                   IMPORT_ANSWER_ALIASES.get(answer.strip().lower(), answer.strip().lower()),
+                   parse_vote_timestamp(timestamp.strip()))
+        except ValueError as e:
+            logging.warning(f"Пропущена некорректная строка CSV {row}: {e}")
+            yield None
+
+def parse_votes_jsonl(file):
+    """Читает голоса из JSONL: по одному объекту с полями user_id, question_id, answer на строку"""
+    for line in file:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+            answer = str(record["answer"]).strip().lower()
+            yield (int(record["user_id"]), record.get("username", ""), record.get("first_name", ""),
+                   int(record["question_id"]), IMPORT_ANSWER_ALIASES.get(answer, answer),
+                   parse_vote_timestamp(record["timestamp"]) if record.get("timestamp") is not None
+                   else datetime.now().isoformat())
+        except (ValueError, KeyError, TypeError, OverflowError, OSError) as e:
+            logging.warning(f"Пропущена некорректная строка JSONL: {e}")
+            yield None
+
+def import_votes_file(path: str, storage=None):
+    """Массовая загрузка голосов из CSV (export_to_csv) или JSONL с отчетом о скорости"""
+    storage = storage or results_storage
+    parser = parse_votes_jsonl if path.endswith((".jsonl", ".json")) else parse_votes_csv
+    
+    accepted = rejected = malformed = 0
+    started = time.perf_counter()
+    with open(path, encoding="utf-8-sig", newline="") as file:
+        batch = []
+        for vote in parser(file):
+            if vote is None:
+                malformed += 1
+                continue
+            batch.append(vote)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                batch_accepted, batch_rejected = storage.add_votes_batch(batch)
+                accepted += batch_accepted
+                rejected += batch_rejected
+                batch = []
+        if batch:
+            batch_accepted, batch_rejected = storage.add_votes_batch(batch)
+            accepted += batch_accepted
+            rejected += batch_rejected
+    
+    elapsed = time.perf_counter() - started
+    total = accepted + rejected + malformed
+    rate = total / elapsed if elapsed > 0 else total
+    logging.info(
+        f"Импорт {path}: строк {total}, принято {accepted}, отклонено (включая уже загруженные) {rejected}, "
+        f"некорректных {malformed} за {elapsed:.2f} с ({rate:.0f} строк/с)"
+    )
+    return accepted, rejected, malformed
+
+def shard_for_user(user_id: int, shard_count: int) -> int:
+    """Номер шарда, которому принадлежит пользователь (стабильный хэш user_id)"""
+    return zlib.crc32(str(user_id).encode()) % shard_count
 
 results_storage = ResultsStorage()
 
-# Flask приложение для Replit
-app = Flask(__name__)
+def get_report_storage(totals_only: bool = False):
+    """Хранилище для отчетов: локальное или сводное по всем шардам.
+    
+    totals_only - нужны только счетчики и число участников (статистика, HTML- и
+    текстовый отчет): в шардированном режиме ответы участников тогда не читаются.
+    """
+    if results_storage.aggregator is not None:
+        if totals_only:
+            return results_storage.aggregator.load_totals()
+        return results_storage.aggregator.load_merged()
+    return results_storage
+
+async def load_report_storage(totals_only: bool = False):
+    """То же для обработчиков бота: сводная база шардов читается в потоке,
+    чтобы не задерживать обновления участников этого шарда"""
+    if results_storage.aggregator is not None:
+        return await asyncio.get_running_loop().run_in_executor(None, get_report_storage, totals_only)
+    return results_storage
+
+# Веб-интерфейс для Replit (Flask загружается при первом запросе, см. create_web_app)
 
-@app.route('/')
 def home():
     """Статусная страница для проверки работы бота"""
+    storage = get_report_storage(totals_only=True)
+    total_answers = sum(sum(stats.values()) for stats in storage.results.values())
+    return render_home_page(storage.participants_count(), total_answers)
+
+def render_home_page(participants: int, total_answers: int):
+    """HTML статусной страницы (общий для Flask и асинхронного веб-интерфейса)"""
     html = """
     <!DOCTYPE html>
     <html>
@@ -502,6 +1795,10 @@ def home():
                 <strong>📝 Текст</strong><br>
                 Текстовый отчет
             </a>
+            <a href="/export/parquet" class="export-btn" download>
+                <strong>🧱 Parquet</strong><br>
+                Все ответы для аналитиков
+            </a>
         </div>
 
         <div class="status">
@@ -513,30 +1810,31 @@ def home():
     </html>
     """
     
-    total_answers = sum(sum(stats.values()) for stats in results_storage.results.values())
-    
-    return render_template_string(html, 
-                                questions_count=len(QUESTIONS),
-                                participants=len(results_storage.user_info),
-                                total_answers=total_answers)
+    # Шаблон рендерится через Jinja2 напрямую, без контекста Flask-приложения
+    from jinja2 import Template
+    return Template(html).render(questions_count=len(QUESTIONS),
+                                 participants=participants,
+                                 total_answers=total_answers)
 
-@app.route('/export/html')
 def export_html():
     """Экспорт в HTML отчет"""
-    html_content = results_storage.export_to_html_report()
-    return html_content
+    from flask import Response, request
+    response = Response(get_report_storage(totals_only=True).export_to_html_report(), mimetype='text/html')
+    # Если отчет не изменился, браузер получит короткий ответ 304
+    response.headers['Cache-Control'] = 'no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
 
-@app.route('/export/text')
 def export_text():
     """Экспорт в текстовый отчет"""
-    text_content = results_storage.export_to_text_report()
+    text_content = get_report_storage(totals_only=True).export_to_text_report()
     return f"<pre>{text_content}</pre>"
 
-@app.route('/export/csv')
 def export_csv():
     """Экспорт в CSV"""
-    csv_data = results_storage.export_to_csv()
-    response = app.response_class(
+    from flask import Response
+    csv_data = get_report_storage().export_to_csv()
+    response = Response(
         response=csv_data,
         status=200,
         mimetype='text/csv',
@@ -544,75 +1842,618 @@ def export_csv():
     )
     return response
 
-@app.route('/health')
+def export_parquet():
+    """Экспорт всех ответов в Parquet"""
+    from flask import Response
+    try:
+        parquet_data = get_report_storage().export_to_parquet()
+    except ImportError:
+        return {"error": "Для экспорта в Parquet установите пакет pyarrow"}, 503
+    response = Response(
+        response=parquet_data,
+        status=200,
+        mimetype='application/vnd.apache.parquet',
+        headers={'Content-Disposition': f'attachment; filename=survey_answers_{datetime.now().strftime("%Y%m%d_%H%M")}.parquet'}
+    )
+    return response
+
 def health():
     """Эндпоинт для проверки здоровья приложения"""
-    total_answers = sum(sum(stats.values()) for stats in results_storage.results.values())
+    storage = get_report_storage(totals_only=True)
+    total_answers = sum(sum(stats.values()) for stats in storage.results.values())
     return {
         "status": "healthy", 
         "questions_count": len(QUESTIONS),
-        "participants": len(results_storage.user_info),
+        "participants": storage.participants_count(),
         "total_answers": total_answers,
+        "shards": SHARD_COUNT,
         "admin_ids": admin_ids
     }
 
+def create_web_app():
+    """Создает Flask-приложение с маршрутами веб-интерфейса"""
+    from flask import Flask
+    web_app = Flask(__name__, static_folder=STATIC_DIR, static_url_path='/static')
+    web_app.config['SEND_FILE_MAX_AGE_DEFAULT'] = STATIC_MAX_AGE
+    web_app.add_url_rule('/', view_func=home)
+    web_app.add_url_rule('/export/html', view_func=export_html)
+    web_app.add_url_rule('/export/text', view_func=export_text)
+    web_app.add_url_rule('/export/csv', view_func=export_csv)
+    web_app.add_url_rule('/export/parquet', view_func=export_parquet)
+    web_app.add_url_rule('/health', view_func=health)
+    return web_app
+
+class LazyWebApp:
+    """WSGI-приложение, которое загружает Flask только при первом веб-запросе"""
+    
+    def __init__(self):
+        self._app = None
+        self._lock = threading.Lock()
+    
+    def get_app(self):
+        if self._app is None:
+            with self._lock:
+                if self._app is None:
+                    started = time.perf_counter()
+                    self._app = create_web_app()
+                    logging.info(f"Веб-интерфейс загружен по первому запросу за {(time.perf_counter() - started) * 1000:.0f} мс")
+        return self._app
+    
+    def __call__(self, environ, start_response):
+        return self.get_app()(environ, start_response)
+
+web_app = LazyWebApp()
+
+# Асинхронный веб-интерфейс (WEB_MODE=async): aiohttp в том же цикле событий, что и бот.
+# Обработчики не блокируют цикл: данные копируются в потоке бота, отчеты строятся в пуле потоков.
+
+web_runner = None
+
+async def render_in_executor(function, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+async def snapshot_report_storage(include_users: bool = True):
+    """Снимок хранилища для отчета без гонок с обработчиками бота.
+    
+    HTML- и текстовому отчету и статусу нужны только счетчики и число
+    участников (include_users=False) - ответы участников для них не копируются.
+    """
+    if results_storage.aggregator is not None:
+        # Сводное хранилище и так создается заново, чтение SQLite - в потоке
+        return await load_report_storage(totals_only=not include_users)
+    if not include_users:
+        participants = await render_in_executor(results_storage.participants_count)
+        return results_storage.snapshot(include_users=False, participants=participants)
+    return results_storage.snapshot()
+
+async def report_summary():
+    """(участников, всего ответов) без копирования ответов участников"""
+    storage = await snapshot_report_storage(include_users=False)
+    total_answers = sum(sum(stats.values()) for stats in storage.results.values())
+    return storage.participants_count(), total_answers
+
+async def async_home(request):
+    from aiohttp import web
+    participants, total_answers = await report_summary()
+    return web.Response(text=render_home_page(participants, total_answers), content_type="text/html")
+
+async def async_health(request):
+    from aiohttp import web
+    participants, total_answers = await report_summary()
+    return web.json_response({
+        "status": "healthy",
+        "questions_count": len(QUESTIONS),
+        "participants": participants,
+        "total_answers": total_answers,
+        "shards": SHARD_COUNT,
+        "admin_ids": admin_ids
+    })
+
+async def async_export_html(request):
+    from aiohttp import web
+    import hashlib
+    storage = await snapshot_report_storage(include_users=False)
+    body = (await render_in_executor(storage.export_to_html_report)).encode("utf-8")
+    # Если отчет не изменился, браузер получит короткий ответ 304
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("If-None-Match", ""):
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=body, content_type="text/html", charset="utf-8", headers=headers)
+
+async def async_export_text(request):
+    from aiohttp import web
+    storage = await snapshot_report_storage(include_users=False)
+    text_content = await render_in_executor(storage.export_to_text_report)
+    return web.Response(text=f"<pre>{text_content}</pre>", content_type="text/html")
+
+async def async_export_csv(request):
+    from aiohttp import web
+    storage = await snapshot_report_storage()
+    csv_data = await render_in_executor(storage.export_to_csv)
+    return web.Response(
+        text=csv_data,
+        content_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename=survey_results_{datetime.now().strftime("%Y%m%d_%H%M")}.csv'}
+    )
+
+async def async_export_parquet(request):
+    from aiohttp import web
+    storage = await snapshot_report_storage()
+    try:
+        parquet_data = await render_in_executor(storage.export_to_parquet)
+    except ImportError:
+        return web.json_response({"error": "Для экспорта в Parquet установите пакет pyarrow"}, status=503)
+    return web.Response(
+        body=parquet_data,
+        content_type="application/vnd.apache.parquet",
+        headers={"Content-Disposition": f'attachment; filename=survey_answers_{datetime.now().strftime("%Y%m%d_%H%M")}.parquet'}
+    )
+
+async def static_cache_headers(request, response):
+    """Статические файлы подключаются с версией в URL, их можно долго кэшировать"""
+    if request.path.startswith("/static/"):
+        response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}"
+
+def create_async_web_app():
+    """Создает aiohttp-приложение с теми же маршрутами, что и Flask-версия"""
+    from aiohttp import web
+    app = web.Application()
+    app.router.add_get('/', async_home)
+    app.router.add_get('/export/html', async_export_html)
+    app.router.add_get('/export/text', async_export_text)
+    app.router.add_get('/export/csv', async_export_csv)
+    app.router.add_get('/export/parquet', async_export_parquet)
+    app.router.add_get('/health', async_health)
+    app.router.add_static('/static', STATIC_DIR)
+    app.on_response_prepare.append(static_cache_headers)
+    return app
+
+async def start_async_web_server():
+    """Запускает aiohttp-сервер в текущем цикле событий (вызывается из post_init)"""
+    from aiohttp import web
+    global web_runner
+    runner = web.AppRunner(create_async_web_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '0.0.0.0', PORT).start()
+    web_runner = runner
+    logging.info(f"Асинхронный веб-интерфейс запущен на порту {PORT}")
+
+async def stop_async_web_server():
+    global web_runner
+    if web_runner is not None:
+        await web_runner.cleanup()
+        web_runner = None
+
 def is_admin(user_id: int) -> bool:
     """Проверяет, является ли пользователь администратором"""
     return user_id in admin_ids
 
+class SurveyCache:
+    """Заранее собранные клавиатуры и фрагменты текстов вопросов.
+    
+    Вопросы статичны, поэтому все, что от них зависит, собирается один раз
+    при загрузке опроса. При обработке ответа остается только подставить прогресс.
+    """
+    
+    __slots__ = ("questions_count", "question_keyboards", "continue_keyboards", "live_keyboards",
+                 "reminder_keyboard", "admin_keyboard", "question_headers", "confirmation_headers")
+    
+    def __init__(self, questions):
+        self.questions_count = len(questions)
+        self.question_keyboards = tuple(
+            InlineKeyboardMarkup([
+                [InlineKeyboardButton("✅ Да", callback_data=f"q{i}_yes")],
+                [InlineKeyboardButton("❌ Нет", callback_data=f"q{i}_no")],
+            ])
+            for i in range(len(questions))
+        )
+        self.continue_keyboards = tuple(
+            InlineKeyboardMarkup([
+                [InlineKeyboardButton("➡️ Следующий вопрос", callback_data=f"continue_{i}")],
+            ])
+            for i in range(len(questions))
+        )
+        self.live_keyboards = tuple(
+            InlineKeyboardMarkup([
+                [InlineKeyboardButton("✅ Да", callback_data=f"live{i}_yes"),
+                 InlineKeyboardButton("❌ Нет", callback_data=f"live{i}_no")],
+            ])
+            for i in range(len(questions))
+        )
+        self.reminder_keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("➡️ Продолжить", callback_data="continue_next")],
+        ])
+        self.admin_keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("📊 Статистика", callback_data="admin_stats")],
+            [InlineKeyboardButton("📥 Выгрузить CSV", callback_data="admin_export")],
+            [InlineKeyboardButton("🧱 Выгрузить Parquet", callback_data="admin_export_parquet")],
+            [InlineKeyboardButton("📝 Текстовый отчет", callback_data="admin_text")],
+            [InlineKeyboardButton("🔬 Аналитика", callback_data="admin_analytics")],
+            [InlineKeyboardButton("🔔 Напомнить незавершившим", callback_data="admin_remind")],
+            [InlineKeyboardButton("🔄 Сбросить результаты", callback_data="admin_reset")],
+            [InlineKeyboardButton("❌ Закрыть", callback_data="admin_close")],
+        ])
+        # "<b>Вопрос N/M</b>\n\nТекст вопроса\n\n" - общая часть вопроса и подтверждения
+        self.question_headers = tuple(
+            f"<b>Вопрос {i + 1}/{len(questions)}</b>\n\n{question}\n\n"
+            for i, question in enumerate(questions)
+        )
+        self.confirmation_headers = tuple(
+            MappingProxyType({
+                "yes": f"{header}<b>Ваш ответ:</b> ✅ Да\n\n",
+                "no": f"{header}<b>Ваш ответ:</b> ❌ Нет\n\n",
+            })
+            for header in self.question_headers
+        )
+
+_survey_cache = None
+
+def get_survey_cache() -> SurveyCache:
+    """Возвращает кэш опроса, собирая его при первом обращении"""
+    global _survey_cache
+    if _survey_cache is None:
+        _survey_cache = SurveyCache(QUESTIONS)
+    return _survey_cache
+
 def get_question_keyboard(question_id: int):
-    """Создает клавиатуру с кнопками Да/Нет для вопроса"""
-    keyboard = [
-        [InlineKeyboardButton("✅ Да", callback_data=f"q{question_id}_yes")],
-        [InlineKeyboardButton("❌ Нет", callback_data=f"q{question_id}_no")],
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    """Клавиатура с кнопками Да/Нет для вопроса"""
+    return get_survey_cache().question_keyboards[question_id]
 
 def get_admin_keyboard():
     """Клавиатура для админ панели"""
+    return get_survey_cache().admin_keyboard
+
+def get_continue_keyboard(next_question_id: int):
+    """Клавиатура для продолжения опроса"""
+    return get_survey_cache().continue_keyboards[next_question_id]
+
+def get_reminder_keyboard():
+    """Клавиатура выбора получателей напоминания"""
     keyboard = [
-        [InlineKeyboardButton("📊 Статистика", callback_data="admin_stats")],
-        [InlineKeyboardButton("📥 Выгрузить CSV", callback_data="admin_export")],
-        [InlineKeyboardButton("📝 Текстовый отчет", callback_data="admin_text")],
-        [InlineKeyboardButton("🔄 Сбросить результаты", callback_data="admin_reset")],
-        [InlineKeyboardButton("❌ Закрыть", callback_data="admin_close")],
+        [InlineKeyboardButton("😴 Неактивны больше суток", callback_data="admin_remind_86400")],
+        [InlineKeyboardButton("⏰ Неактивны больше часа", callback_data="admin_remind_3600")],
+        [InlineKeyboardButton("📋 Все незавершившие", callback_data="admin_remind_0")],
+        [InlineKeyboardButton("📬 Статус рассылки", callback_data="admin_remind_status")],
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def get_continue_keyboard(next_question_id: int):
-    """Клавиатура для продолжения опроса"""
+def get_report_page_keyboard(page: int, total_pages: int):
+    """Клавиатура для листания страниц текстового отчета"""
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("◀️", callback_data=f"admin_page_{page - 1}"))
+    navigation.append(InlineKeyboardButton(f"{page + 1}/{total_pages}", callback_data="admin_page_noop"))
+    if page < total_pages - 1:
+        navigation.append(InlineKeyboardButton("▶️", callback_data=f"admin_page_{page + 1}"))
     keyboard = [
-        [InlineKeyboardButton("➡️ Следующий вопрос", callback_data=f"continue_{next_question_id}")],
+        navigation,
+        [InlineKeyboardButton("📨 Отправить целиком", callback_data="admin_text_all")],
     ]
     return InlineKeyboardMarkup(keyboard)
 
+def telegram_length(text: str) -> int:
+    """Длина текста так, как ее считает Telegram (в UTF-16 символах)"""
+    return len(text.encode('utf-16-le')) // 2
+
+def split_long_section(section: str, limit: int):
+    """Делит слишком длинный раздел отчета по строкам (в крайнем случае - по символам)"""
+    chunks = []
+    current = ""
+    for line in section.splitlines(keepends=True):
+        while telegram_length(html.escape(line)) > limit:
+            # Строка сама по себе не помещается - ищем самый длинный кусок в пределах лимита
+            low, high = 1, len(line)
+            while low < high:
+                middle = (low + high + 1) // 2
+                if telegram_length(html.escape(line[:middle])) <= limit:
+                    low = middle
+                else:
+                    high = middle - 1
+            cut = low
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:cut])
+            line = line[cut:]
+        if current and telegram_length(html.escape(current + line)) > limit:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current:
+        chunks.append(current)
+    return chunks
+
+def paginate_report(sections, limit: int = REPORT_PAGE_LIMIT):
+    """Собирает разделы отчета в страницы, не разрывая вопросы между сообщениями.
+    
+    Возвращает список готовых HTML-страниц (<pre>...</pre>), каждая из которых
+    укладывается в лимит длины сообщения Telegram.
+    """
+    raw_pages = []
+    current = ""
+    for section in sections:
+        if telegram_length(html.escape(section)) > limit:
+            # Раздел не помещается даже на пустую страницу - делим его по строкам
+            if current:
+                raw_pages.append(current)
+                current = ""
+            raw_pages.extend(split_long_section(section, limit))
+            continue
+        if current and telegram_length(html.escape(current + section)) > limit:
+            raw_pages.append(current)
+            current = ""
+        current += section
+    if current:
+        raw_pages.append(current)
+    
+    total_pages = len(raw_pages)
+    pages = []
+    for i, page in enumerate(raw_pages):
+        header = f"<b>📋 Страница {i + 1}/{total_pages}</b>\n" if total_pages > 1 else ""
+        pages.append(f"{header}<pre>{html.escape(page.strip(chr(10)))}</pre>")
+    return pages
+
+async def send_messages_paced(bot, chat_id: int, texts, interval: float = REPORT_SEND_INTERVAL, **kwargs):
+    """Последовательно отправляет сообщения в чат с учетом ограничений Telegram.
+    
+    Между сообщениями выдерживается пауза, а при ответе RetryAfter отправка
+    повторяется после указанной сервером задержки (не больше трех попыток).
+    """
+    for i, text in enumerate(texts):
+        if i > 0:
+            await asyncio.sleep(interval)
+        for attempt in range(3):
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                break
+            except RetryAfter as e:
+                if attempt == 2:
+                    raise
+                logging.warning(f"Flood control, retry in {retry_after_seconds(e)}s")
+                await asyncio.sleep(retry_after_seconds(e))
+
+async def send_full_text_report(bot, chat_id: int):
+    """Отправляет все страницы текстового отчета (фоновая задача, не задерживает обработку обновлений)"""
+    try:
+        pages = paginate_report((await load_report_storage(totals_only=True)).export_to_text_sections())
+        await send_messages_paced(bot, chat_id, pages, parse_mode='HTML')
+    except Exception as e:
+        logging.error(f"Error sending text report: {e}")
+        try:
+            await bot.send_message(
+                chat_id=chat_id,
+                text="❌ <b>Ошибка при отправке отчета</b>",
+                parse_mode='HTML'
+            )
+        except TelegramError:
+            pass
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """Задержка из RetryAfter (в новых версиях PTB это timedelta)"""
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+class RateLimiter:
+    """Равномерно распределяет отправку сообщений: не больше rate в секунду"""
+    
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def wait(self):
+        """Ждет своего "окна" для отправки следующего сообщения"""
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            if self._next_slot > now:
+                await asyncio.sleep(self._next_slot - now)
+                now = self._next_slot
+            self._next_slot = now + self.interval
+    
+    def pause(self, seconds: float):
+        """Приостанавливает все отправки (например, после RetryAfter)"""
+        loop = asyncio.get_running_loop()
+        self._next_slot = max(self._next_slot, loop.time() + seconds)
+
+class BroadcastSender:
+    """Параллельная рассылка сообщений по многим чатам с общим ограничением скорости.
+    
+    Несколько отправителей работают одновременно, но общий темп не превышает
+    rate сообщений в секунду, поэтому время рассылки предсказуемо: ~N / rate.
+    """
+    
+    def __init__(self, rate: float = BROADCAST_RATE, concurrency: int = BROADCAST_CONCURRENCY):
+        self.rate = rate
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate)
+    
+    def estimate_seconds(self, count: int) -> float:
+        return count / self.rate
+    
+    async def send(self, bot, chat_ids, make_message, on_result=None):
+        """Отправляет сообщения во все чаты.
+        
+        make_message(chat_id) возвращает аргументы bot.send_message (text, reply_markup...)
+        или None, если чат нужно пропустить. on_result(chat_id, status, message)
+        вызывается после каждой попытки; status - "delivered", "blocked" или "failed".
+        Возвращает количество сообщений по каждому статусу.
+        """
+        queue = asyncio.Queue()
+        for chat_id in chat_ids:
+            queue.put_nowait(chat_id)
+        stats = {"delivered": 0, "blocked": 0, "failed": 0, "skipped": 0}
+        
+        async def worker():
+            while True:
+                try:
+                    chat_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                kwargs = make_message(chat_id)
+                if kwargs is None:
+                    stats["skipped"] += 1
+                    continue
+                status, message = await self._send_one(bot, chat_id, kwargs)
+                stats[status] += 1
+                if on_result is not None:
+                    on_result(chat_id, status, message)
+        
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return stats
+    
+    async def _send_one(self, bot, chat_id: int, kwargs):
+        """Одна отправка с повтором после RetryAfter"""
+        for _ in range(3):
+            await self.limiter.wait()
+            try:
+                message = await bot.send_message(chat_id=chat_id, **kwargs)
+                return "delivered", message
+            except RetryAfter as e:
+                # Превышен лимит - останавливаем всех отправителей на указанное время
+                self.limiter.pause(retry_after_seconds(e))
+            except Forbidden:
+                # Пользователь заблокировал бота
+                return "blocked", None
+            except TelegramError as e:
+                logging.warning(f"Broadcast to {chat_id} failed: {e}")
+                return "failed", None
+        return "failed", None
+
+def format_progress(user_id: int, cache: SurveyCache):
+    """Строка "N/M (P%)" с прогрессом пользователя"""
+    completed = len(results_storage.get_user_progress(user_id))
+    progress = (completed / cache.questions_count) * 100 if cache.questions_count else 0
+    return f"{completed}/{cache.questions_count} ({progress:.0f}%)"
+
 def get_question_text(question_id: int, user_id: int):
     """Форматирует текст вопроса"""
-    progress = results_storage.get_completion_percentage(user_id)
-    completed = len(results_storage.get_user_progress(user_id))
+    cache = get_survey_cache()
+    return f"{cache.question_headers[question_id]}📊 <b>Прогресс:</b> {format_progress(user_id, cache)}"
+
+def get_answer_confirmation_text(question_id: int, answer: str, user_id: int):
+    """Форматирует текст подтверждения ответа"""
+    cache = get_survey_cache()
+    return f"{cache.confirmation_headers[question_id][answer]}📈 <b>Прогресс:</b> {format_progress(user_id, cache)}"
+
+class Throttle:
+    """Ограничение частоты обновлений: скользящее окно на пользователя и общее.
+    
+    Скользящее окно приближается двумя соседними фиксированными окнами:
+    оценка = предыдущее * (доля, еще попадающая в окно) + текущее.
+    Проверка - O(1), на пользователя хранится 4 числа. Число отслеживаемых
+    пользователей ограничено: давно не активные вытесняются (LRU).
+    """
+    
+    USER = "user"
+    GLOBAL = "global"
+    
+    def __init__(self, window: float = THROTTLE_WINDOW, user_limit: int = THROTTLE_USER_LIMIT,
+                 global_limit: int = THROTTLE_GLOBAL_LIMIT, max_tracked: int = THROTTLE_MAX_TRACKED):
+        self.window = window
+        self.user_limit = user_limit
+        self.global_limit = global_limit
+        self.max_tracked = max_tracked
+        # user_id -> [начало текущего окна, предыдущее окно, текущее окно, время последнего предупреждения]
+        self.users = OrderedDict()
+        self.global_state = [0.0, 0, 0, 0.0]
+        self.stats = {"passed": 0, "dropped_user": 0, "dropped_global": 0}
+        self.offenders = OrderedDict()   # user_id -> число отброшенных обновлений (последние нарушители)
+    
+    def _estimate(self, state, now: float) -> float:
+        """Сдвигает окна к моменту now и возвращает оценку числа событий за окно"""
+        elapsed = now - state[0]
+        if elapsed >= self.window:
+            windows = int(elapsed // self.window)
+            state[1] = state[2] if windows == 1 else 0
+            state[2] = 0
+            state[0] += windows * self.window
+            elapsed = now - state[0]
+        return state[1] * (1 - elapsed / self.window) + state[2]
     
-    text = (
-        f"<b>Вопрос {question_id + 1}/{len(QUESTIONS)}</b>\n\n"
-        f"{QUESTIONS[question_id]}\n\n"
-        f"📊 <b>Прогресс:</b> {completed}/{len(QUESTIONS)} ({progress:.0f}%)"
-    )
+    def check(self, user_id: int, now: float, count_global: bool = True):
+        """Учитывает обновление; возвращает None или причину отказа (USER / GLOBAL).
+        
+        count_global=False - обновление проверяется только по личному лимиту.
+        """
+        state = self.users.get(user_id)
+        if state is None:
+            state = self.users[user_id] = [now, 0, 0, float("-inf")]
+            if len(self.users) > self.max_tracked:
+                self.users.popitem(last=False)
+        else:
+            self.users.move_to_end(user_id)
+        
+        if self._estimate(state, now) >= self.user_limit:
+            self.stats["dropped_user"] += 1
+            self._remember_offender(user_id)
+            return self.USER
+        state[2] += 1
+        if not count_global:
+            self.stats["passed"] += 1
+            return None
+        
+        # Общий лимит учитывает только пропущенные по личному лимиту обновления,
+        # чтобы один флудер не расходовал общий бюджет
+        if self._estimate(self.global_state, now) >= self.global_limit:
+            self.stats["dropped_global"] += 1
+            return self.GLOBAL
+        self.global_state[2] += 1
+        self.stats["passed"] += 1
+        return None
     
-    return text
-
-def get_answer_confirmation_text(question_id: int, answer: str, user_id: int):
-    """Форматирует текст подтверждения ответа"""
-    answer_text = "✅ Да" if answer == "yes" else "❌ Нет"
-    progress = results_storage.get_completion_percentage(user_id)
-    completed = len(results_storage.get_user_progress(user_id))
+    def should_alert(self, user_id: int, now: float) -> bool:
+        """Предупреждать пользователя не чаще раза за окно, чтобы не тратить лимиты Bot API"""
+        state = self.users.get(user_id)
+        if state is None or now - state[3] < self.window:
+            return False
+        state[3] = now
+        return True
     
-    text = (
-        f"<b>Вопрос {question_id + 1}/{len(QUESTIONS)}</b>\n\n"
-        f"{QUESTIONS[question_id]}\n\n"
-        f"<b>Ваш ответ:</b> {answer_text}\n\n"
-        f"📈 <b>Прогресс:</b> {completed}/{len(QUESTIONS)} ({progress:.0f}%)"
+    def _remember_offender(self, user_id: int):
+        self.offenders[user_id] = self.offenders.pop(user_id, 0) + 1
+        if len(self.offenders) > 100:
+            self.offenders.popitem(last=False)
+    
+    def report(self) -> dict:
+        """Счетчики для админ-панели"""
+        top = sorted(self.offenders.items(), key=lambda item: item[1], reverse=True)[:5]
+        return {**self.stats, "tracked_users": len(self.users), "top_offenders": top}
+
+throttle = Throttle()
+
+async def throttle_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Предварительный обработчик: отбрасывает обновления сверх лимитов до основной логики"""
+    user = update.effective_user
+    if user is None or is_admin(user.id):
+        return
+    now = time.monotonic()
+    # Ответы на открытый вопрос живого опроса ожидаемо приходят всплеском от всех
+    # участников сразу - для них действует только личный лимит
+    query = update.callback_query
+    live_answer = (
+        query is not None and query.data is not None and query.data.startswith("live")
+        and live_session is not None and live_session.is_open
     )
+    reason = throttle.check(user.id, now, count_global=not live_answer)
+    if reason is None:
+        return
     
-    return text
+    if THROTTLE_MODE == "alert" and throttle.should_alert(user.id, now):
+        text = (
+            "⏳ Слишком много нажатий. Подождите несколько секунд."
+            if reason == Throttle.USER else
+            "⏳ Бот сейчас перегружен. Попробуйте через несколько секунд."
+        )
+        try:
+            if update.callback_query:
+                await update.callback_query.answer(text)
+            elif update.effective_message:
+                await update.effective_message.reply_text(text)
+        except TelegramError as e:
+            logging.warning(f"Throttle alert to {user.id} failed: {e}")
+    raise ApplicationHandlerStop
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отправляет приветственное сообщение и первый вопрос"""
@@ -625,12 +2466,15 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "👑 <b>Панель администратора</b>\n\n"
             "Вы являетесь администратором этого бота. "
             "Администраторы не участвуют в опросе, а только управляют статистикой.\n\n"
-            "Используйте команду /admin для просмотра статистики и управления опросом."
+            "Используйте команду /admin для просмотра статистики и управления опросом.\n"
+            "Живой опрос в зале: /live - начать, /live_next - следующий вопрос, /live_stop - завершить.\n"
+            "История голосов: /audit user &lt;id&gt; или /audit q &lt;номер вопроса&gt;."
         )
         await update.message.reply_text(admin_text, parse_mode='HTML')
         return
     
-    # Проверяем прогресс пользователя
+    # Проверяем прогресс пользователя (и возвращаем его из архива, если нужно)
+    results_storage.ensure_loaded(user_id)
     completed = len(results_storage.get_user_progress(user_id))
     progress = results_storage.get_completion_percentage(user_id)
     
@@ -671,17 +2515,19 @@ async def handle_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     user_id = user.id
     
+    data = query.data
+    question_id = int(data[1])
+    answer = data.split("_")[1]
+    
     # Администраторы не могут участвовать в опросе
     if is_admin(user_id):
+        # add_vote отклоняет голос администратора и записывает попытку в журнал голосов
+        results_storage.add_vote(question_id, answer, user_id, user.username, user.first_name)
         await query.answer("❌ Администраторы не могут участвовать в опросе.", show_alert=True)
         return
         
     await query.answer()
     
-    data = query.data
-    question_id = int(data[1])
-    answer = data.split("_")[1]
-    
     # Обновляем результаты
     success = results_storage.add_vote(question_id, answer, user_id, user.username, user.first_name)
     
@@ -705,7 +2551,6 @@ async def handle_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if next_question is not None:
         # Ждем 1 секунду перед показом следующего вопроса
         await context.bot.send_chat_action(chat_id=user_id, action="typing")
-        import asyncio
         await asyncio.sleep(1)
         
         question_text = get_question_text(next_question, user_id)
@@ -740,18 +2585,38 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     stats_text = "👑 <b>Панель администратора</b>\n\n"
     
     # Общая статистика
-    total_answers = sum(sum(stats.values()) for stats in results_storage.results.values())
-    total_participants = len(results_storage.user_info)
+    storage = await load_report_storage(totals_only=True)
+    total_answers = sum(sum(stats.values()) for stats in storage.results.values())
+    total_participants = storage.participants_count()
     
     stats_text += f"📊 <b>Общая статистика:</b>\n"
     stats_text += f"• Участников: {total_participants}\n"
     stats_text += f"• Всего ответов: {total_answers}\n"
     stats_text += f"• Вопросов: {len(QUESTIONS)}\n\n"
     
+    # Использование памяти (по процессу, обрабатывающему команду)
+    memory = results_storage.memory_report()
+    stats_text += f"💾 <b>Память:</b>\n"
+    stats_text += f"• В памяти: {memory['resident_users']} участников (~{memory['storage_bytes'] / 1024 / 1024:.1f} МБ)\n"
+    stats_text += f"• В архиве: {memory['archived_users']} участников\n"
+    if memory["rss_bytes"] is not None:
+        stats_text += f"• Процесс: {memory['rss_bytes'] / 1024 / 1024:.1f} МБ\n"
+    stats_text += "\n"
+    
+    # Защита от флуда (по процессу, обрабатывающему команду)
+    throttling = throttle.report()
+    stats_text += f"🛡 <b>Защита от флуда</b> ({THROTTLE_MODE}):\n"
+    stats_text += f"• Пропущено: {throttling['passed']}\n"
+    stats_text += f"• Отброшено: {throttling['dropped_user']} (лимит пользователя), {throttling['dropped_global']} (общий лимит)\n"
+    if throttling["top_offenders"]:
+        offenders = ", ".join(f"<code>{user_id}</code> ({count})" for user_id, count in throttling["top_offenders"])
+        stats_text += f"• Нарушители: {offenders}\n"
+    stats_text += "\n"
+    
     # Статистика по правильным ответам
     total_correct_percent = 0
     for i in range(len(QUESTIONS)):
-        stats = results_storage.results[i]
+        stats = storage.results[i]
         total = stats["yes"] + stats["no"]
         correct_count = stats["yes"] if CORRECT_ANSWERS[i] == "yes" else stats["no"]
         correct_percent = (correct_count / total * 100) if total > 0 else 0
@@ -763,7 +2628,7 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Прогресс по вопросам
     stats_text += "<b>Прогресс по вопросам:</b>\n"
     for i in range(len(QUESTIONS)):
-        stats = results_storage.results[i]
+        stats = storage.results[i]
         total = stats["yes"] + stats["no"]
         answered_pct = (total / total_participants * 100) if total_participants > 0 else 0
         
@@ -790,9 +2655,10 @@ async def handle_admin_actions(update: Update, context: ContextTypes.DEFAULT_TYP
     if action == "admin_stats":
         # Показываем детальную статистику
         stats_text = "📊 <b>Детальная статистика с эталонными ответами:</b>\n\n"
+        storage = await load_report_storage(totals_only=True)
         
         for i in range(len(QUESTIONS)):
-            stats = results_storage.results[i]
+            stats = storage.results[i]
             total = stats["yes"] + stats["no"]
             yes_percent = (stats["yes"] / total * 100) if total > 0 else 0
             no_percent = (stats["no"] / total * 100) if total > 0 else 0
@@ -814,7 +2680,7 @@ async def handle_admin_actions(update: Update, context: ContextTypes.DEFAULT_TYP
     elif action == "admin_export":
         # Выгрузка в CSV
         try:
-            csv_data = results_storage.export_to_csv()
+            csv_data = (await load_report_storage()).export_to_csv()
             csv_file = io.BytesIO(csv_data.encode('utf-8'))
             csv_file.seek(0)
             csv_file.name = f"survey_results_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
@@ -834,34 +2700,49 @@ async def handle_admin_actions(update: Update, context: ContextTypes.DEFAULT_TYP
                 parse_mode='HTML'
             )
     
+    elif action == "admin_export_parquet":
+        # Выгрузка всех ответов в Parquet: снимок делается в цикле событий,
+        # а файл (с чтением архива) строится в потоке
+        try:
+            storage = await snapshot_report_storage()
+            parquet_data = await render_in_executor(storage.export_to_parquet)
+            parquet_file = io.BytesIO(parquet_data)
+            parquet_file.name = f"survey_answers_{datetime.now().strftime('%Y%m%d_%H%M')}.parquet"
+            
+            await context.bot.send_document(
+                chat_id=user_id,
+                document=parquet_file,
+                filename=parquet_file.name,
+                caption="🧱 <b>Все ответы участников в формате Parquet</b>\n\n"
+                        "По строке на ответ: участник, вопрос, ответ, правильность, время.",
+                parse_mode='HTML'
+            )
+        except ImportError:
+            await context.bot.send_message(
+                chat_id=user_id,
+                text="❌ <b>Для экспорта в Parquet установите пакет pyarrow</b>",
+                parse_mode='HTML'
+            )
+        except Exception as e:
+            logging.error(f"Error exporting Parquet: {e}")
+            await context.bot.send_message(
+                chat_id=user_id,
+                text="❌ <b>Ошибка при создании Parquet файла</b>",
+                parse_mode='HTML'
+            )
+    
     elif action == "admin_text":
-        # Отправляем текстовый отчет
+        # Отправляем текстовый отчет одним сообщением с листанием страниц
         try:
-            text_report = results_storage.export_to_text_report()
+            pages = paginate_report((await load_report_storage(totals_only=True)).export_to_text_sections())
+            context.user_data["report_pages"] = pages
             
-            # Если отчет слишком длинный, разбиваем на части
-            if len(text_report) > 4000:
-                parts = [text_report[i:i+4000] for i in range(0, len(text_report), 4000)]
-                for i, part in enumerate(parts):
-                    if i == 0:
-                        await context.bot.send_message(
-                            chat_id=user_id,
-                            text=f"<pre>{part}</pre>",
-                            parse_mode='HTML'
-                        )
-                    else:
-                        # Для последующих частей добавляем заголовок продолжения
-                        await context.bot.send_message(
-                            chat_id=user_id,
-                            text=f"<pre>📋 ПРОДОЛЖЕНИЕ ОТЧЕТА:\n\n{part}</pre>",
-                            parse_mode='HTML'
-                        )
-            else:
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=f"<pre>{text_report}</pre>",
-                    parse_mode='HTML'
-                )
+            await context.bot.send_message(
+                chat_id=user_id,
+                text=pages[0],
+                reply_markup=get_report_page_keyboard(0, len(pages)) if len(pages) > 1 else None,
+                parse_mode='HTML'
+            )
                 
         except Exception as e:
             logging.error(f"Error generating text report: {e}")
@@ -871,6 +2752,80 @@ async def handle_admin_actions(update: Update, context: ContextTypes.DEFAULT_TYP
                 parse_mode='HTML'
             )
     
+    elif action.startswith("admin_page_"):
+        # Листание страниц отчета (редактируем одно и то же сообщение)
+        if action == "admin_page_noop":
+            return
+        
+        pages = context.user_data.get("report_pages")
+        if not pages:
+            # Страницы потерялись (например, после перезапуска) - собираем заново
+            pages = paginate_report((await load_report_storage(totals_only=True)).export_to_text_sections())
+            context.user_data["report_pages"] = pages
+        
+        page = min(max(int(action.split("_")[2]), 0), len(pages) - 1)
+        await query.edit_message_text(
+            pages[page],
+            reply_markup=get_report_page_keyboard(page, len(pages)),
+            parse_mode='HTML'
+        )
+    
+    elif action == "admin_text_all":
+        # Отправляем все страницы отчета отдельными сообщениями в фоне:
+        # паузы между страницами не должны задерживать ответы участникам
+        start_background_task(send_full_text_report(context.bot, user_id), outbound=True)
+    
+    elif action == "admin_analytics":
+        # Сводка фоновой аналитики
+        analytics = await load_latest_analytics()
+        if analytics is None:
+            await query.edit_message_text(
+                "ℹ️ Аналитика еще не рассчитана (пересчет раз в "
+                f"{ANALYTICS_INTERVAL // 60} мин., требуется пакет numpy)."
+            )
+        else:
+            await query.edit_message_text(analytics_text(analytics), parse_mode='HTML')
+    
+    elif action == "admin_remind":
+        # Выбор получателей напоминания
+        await query.edit_message_text(
+            "🔔 <b>Напоминание незавершившим опрос</b>\n\n"
+            f"Не закончили опрос: {len(results_storage.activity_index)}\n"
+            "Кому отправить напоминание с кнопкой «➡️ Продолжить»?",
+            reply_markup=get_reminder_keyboard(),
+            parse_mode='HTML'
+        )
+    
+    elif action == "admin_remind_status":
+        if reminder_campaign is None:
+            await query.edit_message_text("ℹ️ Рассылок напоминаний еще не было.")
+        else:
+            await query.edit_message_text(reminder_campaign.status_text(), parse_mode='HTML')
+    
+    elif action.startswith("admin_remind_"):
+        # Запуск рассылки напоминаний
+        if results_storage.aggregator is not None:
+            await query.edit_message_text("❌ Напоминания недоступны в шардированном режиме.")
+            return
+        if reminder_campaign is not None and not reminder_campaign.finished:
+            await query.edit_message_text(
+                "⏳ Предыдущая рассылка еще идет.\n\n" + reminder_campaign.status_text(),
+                parse_mode='HTML'
+            )
+            return
+        
+        targets = results_storage.select_inactive_users(int(action.split("_")[2]))
+        if not targets:
+            await query.edit_message_text("ℹ️ Нет участников, которым нужно напомнить.")
+            return
+        
+        start_reminder_campaign(context.bot, ReminderCampaign(targets, user_id))
+        await query.edit_message_text(
+            f"📣 Рассылка напоминаний запущена: {len(targets)} получателей "
+            f"(~{broadcast_sender.estimate_seconds(len(targets)):.0f} сек.)\n"
+            "Статус: /admin → 🔔 → 📬 Статус рассылки"
+        )
+    
     elif action == "admin_reset":
         # Подтверждение сброса
         confirm_keyboard = InlineKeyboardMarkup([
@@ -916,6 +2871,7 @@ async def progress_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
+    results_storage.ensure_loaded(user_id)
     completed = len(results_storage.get_user_progress(user_id))
     progress = results_storage.get_completion_percentage(user_id)
     
@@ -951,12 +2907,23 @@ async def handle_continue(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
     await query.answer()
     
-    # Получаем номер вопроса из callback_data
-    question_id = int(query.data.split("_")[1])
+    # Получаем номер вопроса из callback_data ("continue_next" - из напоминания)
+    if query.data == "continue_next":
+        question_id = results_storage.get_next_question(user_id)
+    else:
+        question_id = int(query.data.split("_")[1])
     
     # Удаляем сообщение с прогрессом
     await query.delete_message()
     
+    if question_id is None:
+        await context.bot.send_message(
+            chat_id=user_id,
+            text="🎉 <b>Вы уже ответили на все вопросы опроса!</b>\nСпасибо за участие!",
+            parse_mode='HTML'
+        )
+        return
+    
     # Отправляем вопрос
     question_text = get_question_text(question_id, user_id)
     await context.bot.send_message(
@@ -966,10 +2933,472 @@ async def handle_continue(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode='HTML'
     )
 
+class LiveSession:
+    """Живой опрос: ведущий переключает вопросы, бот рассылает их всем участникам сразу"""
+    
+    def __init__(self, admin_chat_id: int):
+        self.admin_chat_id = admin_chat_id
+        self.question_id = None
+        self.is_open = False
+        self.counts = {"yes": 0, "no": 0}
+        self.voters = set()
+        self.round = 0
+        self.close_task = None
+    
+    def start_question(self, question_id: int):
+        self.question_id = question_id
+        self.is_open = False
+        self.counts = {"yes": 0, "no": 0}
+        self.voters = set()
+        self.round += 1
+    
+    def summary_text(self):
+        total = self.counts["yes"] + self.counts["no"]
+        correct = self.counts[CORRECT_ANSWERS[self.question_id]]
+        correct_percent = (correct / total * 100) if total > 0 else 0
+        return (
+            f"🎤 <b>Живой опрос: вопрос {self.question_id + 1}/{len(QUESTIONS)}</b>\n\n"
+            f"✅ Да: {self.counts['yes']}\n"
+            f"❌ Нет: {self.counts['no']}\n"
+            f"👥 Ответили: {total}\n"
+            f"📗 Правильных: {correct} ({correct_percent:.1f}%)"
+        )
+
+live_session = None
+broadcast_sender = BroadcastSender()
+
+class ReminderCampaign:
+    """Рассылка напоминаний незавершившим опрос.
+    
+    Получатели обрабатываются пакетами; после каждого пакета состояние
+    (позиция и статус доставки по каждому получателю) сохраняется в файл,
+    поэтому прерванную рассылку можно продолжить после перезапуска.
+    """
+    
+    def __init__(self, targets, admin_chat_id: int, state_file: str = REMINDER_STATE_FILE):
+        self.targets = list(targets)
+        self.admin_chat_id = admin_chat_id
+        self.state_file = state_file
+        self.created = datetime.now().isoformat()
+        self.cursor = 0
+        self.statuses = {}
+        self.finished = False
+    
+    def counts(self):
+        counts = {"delivered": 0, "blocked": 0, "failed": 0, "skipped": 0}
+        for status in self.statuses.values():
+            counts[status] += 1
+        return counts
+    
+    def status_text(self):
+        counts = self.counts()
+        state = "завершена" if self.finished else "идет"
+        return (
+            f"📬 <b>Рассылка напоминаний ({state})</b>\n\n"
+            f"• Получателей: {len(self.targets)}\n"
+            f"• Обработано: {len(self.statuses)}\n"
+            f"• Доставлено: {counts['delivered']}\n"
+            f"• Заблокировали бота: {counts['blocked']}\n"
+            f"• Ошибок: {counts['failed']}\n"
+            f"• Уже завершили опрос: {counts['skipped']}"
+        )
+    
+    def save(self):
+        """Атомарно сохраняет состояние рассылки"""
+        state = {
+            "created": self.created,
+            "admin_chat_id": self.admin_chat_id,
+            "targets": self.targets,
+            "cursor": self.cursor,
+            "statuses": {str(user_id): status for user_id, status in self.statuses.items()},
+            "finished": self.finished,
+        }
+        write_file_atomic(self.state_file, json.dumps(state))
+    
+    @classmethod
+    def load(cls, state_file: str = REMINDER_STATE_FILE):
+        """Загружает сохраненную рассылку или возвращает None"""
+        try:
+            with open(state_file, encoding="utf-8") as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return None
+        campaign = cls(state["targets"], state["admin_chat_id"], state_file)
+        campaign.created = state["created"]
+        campaign.cursor = state["cursor"]
+        campaign.statuses = {int(user_id): status for user_id, status in state["statuses"].items()}
+        campaign.finished = state["finished"]
+        return campaign
+    
+    def make_message(self, user_id: int):
+        """Текст напоминания; None - если пользователь уже завершил опрос"""
+        entry = results_storage.activity_index.get(user_id)
+        if entry is None:
+            return None
+        return {
+            "text": (
+                "👋 <b>Вы начали опрос практикума для воспитателей, но еще не закончили.</b>\n\n"
+                f"Отвечено вопросов: {entry[1]}/{len(QUESTIONS)}. Продолжим?"
+            ),
+            "reply_markup": get_survey_cache().reminder_keyboard,
+            "parse_mode": 'HTML',
+        }
+    
+    def record(self, user_id: int, status: str, message=None):
+        self.statuses[user_id] = status
+    
+    async def run(self, bot, sender: BroadcastSender):
+        """Отправляет оставшиеся напоминания пакетами"""
+        try:
+            while self.cursor < len(self.targets):
+                batch = [
+                    user_id for user_id in self.targets[self.cursor:self.cursor + REMINDER_BATCH_SIZE]
+                    if user_id not in self.statuses
+                ]
+                await sender.send(bot, batch, self.make_message, on_result=self.record)
+                for user_id in batch:
+                    # Пропущенные отправителем пользователи уже завершили опрос
+                    self.statuses.setdefault(user_id, "skipped")
+                self.cursor += REMINDER_BATCH_SIZE
+                self.save()
+        except asyncio.CancelledError:
+            # Остановка бота: сохраняем статусы уже отправленных, чтобы не повторять их
+            self.save()
+            raise
+        
+        self.finished = True
+        self.save()
+        await bot.send_message(chat_id=self.admin_chat_id, text=self.status_text(), parse_mode='HTML')
+
+reminder_campaign = None
+
+def start_reminder_campaign(bot, campaign: ReminderCampaign):
+    """Запускает рассылку напоминаний в фоне"""
+    global reminder_campaign
+    reminder_campaign = campaign
+    campaign.save()
+    return start_background_task(campaign.run(bot, broadcast_sender), outbound=True)
+
+async def resume_reminder_campaign(application: Application):
+    """Продолжает рассылку напоминаний, прерванную перезапуском"""
+    campaign = ReminderCampaign.load()
+    if campaign is None or campaign.finished:
+        return
+    logging.info(f"Продолжаем рассылку напоминаний: обработано {len(campaign.statuses)} из {len(campaign.targets)}")
+    start_reminder_campaign(application.bot, campaign)
+
+async def run_live_round(bot, session: LiveSession):
+    """Рассылает текущий вопрос всем участникам и закрывает голосование по таймеру"""
+    round_number = session.round
+    question_id = session.question_id
+    cache = get_survey_cache()
+    recipients = [user_id for user_id, _, _ in (await load_report_storage()).iter_users() if not is_admin(user_id)]
+    
+    text = (
+        f"🎤 <b>Живой опрос</b>\n\n"
+        f"{cache.question_headers[question_id]}"
+        f"⏱ Время на ответ: {LIVE_VOTE_SECONDS} сек."
+    )
+    await bot.send_message(
+        chat_id=session.admin_chat_id,
+        text=f"📣 Рассылаю вопрос {question_id + 1} участникам: {len(recipients)} "
+             f"(~{broadcast_sender.estimate_seconds(len(recipients)):.0f} сек.)"
+    )
+    
+    # Голосование открыто с начала рассылки, а таймер идет после ее окончания,
+    # чтобы у последних получателей было столько же времени, сколько у первых
+    session.is_open = True
+    stats = await broadcast_sender.send(
+        bot, recipients,
+        lambda chat_id: {"text": text, "reply_markup": cache.live_keyboards[question_id], "parse_mode": 'HTML'}
+    )
+    await bot.send_message(
+        chat_id=session.admin_chat_id,
+        text=f"✅ Доставлено: {stats['delivered']}, заблокировали бота: {stats['blocked']}, "
+             f"ошибок: {stats['failed']}. Голосование закроется через {LIVE_VOTE_SECONDS} сек."
+    )
+    
+    await asyncio.sleep(LIVE_VOTE_SECONDS)
+    if session is not live_session or session.round != round_number:
+        return  # Ведущий уже переключил вопрос или завершил живой опрос
+    session.is_open = False
+    await bot.send_message(
+        chat_id=session.admin_chat_id,
+        text=session.summary_text() + "\n\n🔒 Голосование закрыто. /live_next - следующий вопрос, /live_stop - завершить.",
+        parse_mode='HTML'
+    )
+
+async def start_live_question(bot, session: LiveSession, question_id: int):
+    """Переключает живой опрос на вопрос и запускает его рассылку в фоне"""
+    if session.close_task is not None:
+        session.close_task.cancel()
+    session.start_question(question_id)
+    session.close_task = start_background_task(run_live_round(bot, session), outbound=True)
+
+async def live_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/live [N] - начать живой опрос с вопроса N (по умолчанию с первого)"""
+    global live_session
+    user_id = update.effective_user.id
+    if not is_admin(user_id):
+        await update.message.reply_text("❌ Эта команда доступна только администраторам.")
+        return
+    if results_storage.aggregator is not None:
+        await update.message.reply_text("❌ Живой опрос недоступен в шардированном режиме.")
+        return
+    
+    question_id = 0
+    if context.args:
+        try:
+            question_id = int(context.args[0]) - 1
+        except ValueError:
+            question_id = -1
+    if not 0 <= question_id < len(QUESTIONS):
+        await update.message.reply_text(f"❌ Укажите номер вопроса от 1 до {len(QUESTIONS)}.")
+        return
+    
+    live_session = LiveSession(user_id)
+    await start_live_question(context.bot, live_session, question_id)
+
+async def live_next_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/live_next - перейти к следующему вопросу живого опроса"""
+    user_id = update.effective_user.id
+    if not is_admin(user_id):
+        await update.message.reply_text("❌ Эта команда доступна только администраторам.")
+        return
+    if live_session is None:
+        await update.message.reply_text("ℹ️ Живой опрос не запущен. Используйте /live.")
+        return
+    
+    if live_session.question_id + 1 >= len(QUESTIONS):
+        await update.message.reply_text(
+            live_session.summary_text() + "\n\n🏁 Это был последний вопрос. /live_stop - завершить.",
+            parse_mode='HTML'
+        )
+        return
+    await start_live_question(context.bot, live_session, live_session.question_id + 1)
+
+async def live_stop_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/live_stop - завершить живой опрос"""
+    global live_session
+    user_id = update.effective_user.id
+    if not is_admin(user_id):
+        await update.message.reply_text("❌ Эта команда доступна только администраторам.")
+        return
+    if live_session is None:
+        await update.message.reply_text("ℹ️ Живой опрос не запущен.")
+        return
+    
+    session, live_session = live_session, None
+    if session.close_task is not None:
+        session.close_task.cancel()
+    await update.message.reply_text(
+        session.summary_text() + "\n\n🏁 Живой опрос завершен.",
+        parse_mode='HTML'
+    )
+
+async def handle_live_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обрабатывает ответ на вопрос живого опроса"""
+    query = update.callback_query
+    user = update.effective_user
+    user_id = user.id
+    
+    question_id = int(query.data[4])
+    answer = query.data.split("_")[1]
+    if is_admin(user_id):
+        # add_vote отклоняет голос администратора и записывает попытку в журнал голосов
+        results_storage.add_vote(question_id, answer, user_id, user.username, user.first_name)
+        await query.answer("❌ Администраторы не могут участвовать в опросе.", show_alert=True)
+        return
+    
+    session = live_session
+    if session is None or not session.is_open or session.question_id != question_id:
+        await query.answer("⏱ Голосование по этому вопросу закрыто.", show_alert=True)
+        return
+    if user_id in session.voters:
+        await query.answer("Вы уже ответили на этот вопрос.")
+        return
+    
+    if not results_storage.add_vote(question_id, answer, user_id, user.username, user.first_name):
+        await query.answer("❌ Произошла ошибка при сохранении ответа.", show_alert=True)
+        return
+    session.voters.add(user_id)
+    session.counts[answer] += 1
+    
+    await query.answer("✅ Ответ принят")
+    await query.edit_message_text(
+        get_survey_cache().confirmation_headers[question_id][answer].rstrip(),
+        parse_mode='HTML'
+    )
+
+async def audit_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/audit user <id> или /audit q <номер> - история голосов для разбора спорных случаев"""
+    user_id = update.effective_user.id
+    if not is_admin(user_id):
+        await update.message.reply_text("❌ Эта команда доступна только администраторам.")
+        return
+    if results_storage.audit_log is None:
+        await update.message.reply_text("ℹ️ Журнал голосов отключен.")
+        return
+    
+    usage = "Использование: /audit user &lt;id&gt; или /audit q &lt;номер вопроса&gt;"
+    if len(context.args) != 2 or context.args[0] not in ("user", "q"):
+        await update.message.reply_text(usage, parse_mode='HTML')
+        return
+    try:
+        value = int(context.args[1])
+    except ValueError:
+        await update.message.reply_text(usage, parse_mode='HTML')
+        return
+    
+    # Запрос читает старые файлы журнала и журналы шардов - выполняем его в потоке
+    loop = asyncio.get_running_loop()
+    audit_log = results_storage.audit_log
+    if context.args[0] == "user":
+        events = await loop.run_in_executor(None, lambda: audit_log.query(user_id=value, limit=30))
+        title = f"пользователь {value}"
+    else:
+        events = await loop.run_in_executor(None, lambda: audit_log.query(question_id=value - 1, limit=30))
+        title = f"вопрос {value}"
+    
+    if not events:
+        await update.message.reply_text(f"ℹ️ В журнале нет событий: {title}.")
+        return
+    
+    lines = [f"🗂 Журнал голосов: {title} (последние {len(events)})", ""]
+    for event in events:
+        question = f"Q{event['question_id'] + 1}" if event["question_id"] is not None else "Q?"
+        lines.append(
+            f"{event['time'].strftime('%d.%m %H:%M:%S')} {event['user_id']} {question} "
+            f"{event['answer']} - {AuditLog.EVENT_NAMES.get(event['event'], event['event'])}"
+        )
+    await update.message.reply_text(f"<pre>{html.escape(chr(10).join(lines))}</pre>", parse_mode='HTML')
+
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик ошибок"""
     logging.error(f"Exception while handling an update: {context.error}")
 
+async def memory_governor_loop():
+    """Периодически выгружает неактивных участников из памяти"""
+    while True:
+        await asyncio.sleep(MEMORY_CHECK_INTERVAL)
+        try:
+            results_storage.enforce_memory_limits()
+        except Exception as e:
+            logging.error(f"Error enforcing memory limits: {e}")
+
+def write_file_atomic(path: str, data: str):
+    """Записывает файл атомарно: во временный файл, fsync и переименование"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+def write_checkpoint(storage, path: str):
+    """Сериализует снимок хранилища и атомарно записывает контрольную точку"""
+    write_file_atomic(path, storage.checkpoint_payload())
+
+async def save_checkpoint():
+    """Сохраняет контрольную точку: в цикле событий только копируются словари,
+    сериализация в JSON и запись выполняются в потоке"""
+    version = results_storage.version
+    reloaded = dict(results_storage.archived_resident)
+    snapshot = results_storage.snapshot()
+    await asyncio.get_running_loop().run_in_executor(None, write_checkpoint, snapshot, CHECKPOINT_FILE)
+    # Участники из снимка теперь сохранены в точке - их копии в архиве больше не нужны
+    if results_storage.archive is not None:
+        results_storage.release_archived(reloaded)
+    return version
+
+async def checkpoint_loop():
+    """Периодически сохраняет контрольную точку, если результаты изменились"""
+    saved_version = None  # Первое сохранение - всегда (включая загруженное при запуске)
+    while True:
+        await asyncio.sleep(CHECKPOINT_INTERVAL)
+        if results_storage.version == saved_version:
+            continue
+        try:
+            saved_version = await save_checkpoint()
+        except Exception as e:
+            logging.error(f"Error saving checkpoint: {e}")
+
+background_tasks = set()
+# Задачи с исходящими рассылками: при остановке их дожидаются, а не отменяют сразу
+outbound_tasks = set()
+
+def start_background_task(coroutine, outbound: bool = False):
+    """Запускает фоновую задачу в цикле событий бота и сохраняет ссылку на нее"""
+    task = asyncio.get_running_loop().create_task(coroutine)
+    tasks = outbound_tasks if outbound else background_tasks
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+    return task
+
+async def post_init(application: Application):
+    """Запуск фоновых задач после инициализации бота"""
+    results_storage.rebuild_activity_index()
+    start_background_task(memory_governor_loop())
+    start_background_task(checkpoint_loop())
+    start_background_task(analytics_loop())
+    if WEB_MODE == "async":
+        await start_async_web_server()
+    await resume_reminder_campaign(application)
+    startup_timeline.mark("инициализация бота")
+    startup_timeline.log()
+
+async def post_stop(application: Application):
+    """Корректная остановка: к этому моменту новые обновления уже не принимаются,
+    а обработчики текущих завершены. Дожидаемся рассылок и сохраняем результаты."""
+    started = time.perf_counter()
+    deadline = started + SHUTDOWN_DEADLINE
+    
+    # Периодические задачи больше не нужны
+    for task in list(background_tasks):
+        task.cancel()
+    
+    # Даем исходящим рассылкам время закончиться, оставшиеся отменяем
+    # (рассылка напоминаний сохраняет свое состояние и продолжится после запуска)
+    pending = set(outbound_tasks)
+    if pending:
+        logging.info(f"Ожидание исходящих рассылок: {len(pending)}")
+        _, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - time.perf_counter()))
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    
+    try:
+        if results_storage.aggregator is None:
+            await save_checkpoint()
+        if web_server is not None:
+            web_server.shutdown()
+        await stop_async_web_server()
+    except Exception as e:
+        logging.error(f"Error during shutdown: {e}")
+    
+    total_answers = sum(sum(stats.values()) for stats in results_storage.results.values())
+    logging.info(
+        f"Бот остановлен за {time.perf_counter() - started:.1f} с: сохранено голосов {total_answers}, "
+        f"прервано рассылок {len(pending)}"
+    )
+
+def register_handlers(application: Application):
+    """Регистрирует обработчики команд и кнопок"""
+    # Проверка лимитов выполняется раньше всех остальных обработчиков
+    application.add_handler(TypeHandler(Update, throttle_update), group=-2)
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("admin", admin_command))
+    application.add_handler(CommandHandler("progress", progress_command))
+    application.add_handler(CallbackQueryHandler(handle_answer, pattern="^q[0-9]_(yes|no)$"))
+    application.add_handler(CallbackQueryHandler(handle_admin_actions, pattern="^admin_"))
+    application.add_handler(CallbackQueryHandler(handle_continue, pattern="^continue_([0-9]|next)$"))
+    application.add_handler(CommandHandler("live", live_command))
+    application.add_handler(CommandHandler("live_next", live_next_command))
+    application.add_handler(CommandHandler("live_stop", live_stop_command))
+    application.add_handler(CommandHandler("audit", audit_command))
+    application.add_handler(CallbackQueryHandler(handle_live_answer, pattern="^live[0-9]_(yes|no)$"))
+    application.add_error_handler(error_handler)
+
 def main():
     """Основная функция запуска"""
     if not BOT_TOKEN:
@@ -977,28 +3406,185 @@ def main():
         return
     
     # Создаем приложение бота
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = Application.builder().token(BOT_TOKEN).post_init(post_init).post_stop(post_stop).build()
     
     # Регистрируем обработчики
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("admin", admin_command))
-    application.add_handler(CommandHandler("progress", progress_command))
-    application.add_handler(CallbackQueryHandler(handle_answer, pattern="^q[0-9]_(yes|no)$"))
-    application.add_handler(CallbackQueryHandler(handle_admin_actions, pattern="^admin_"))
-    application.add_handler(CallbackQueryHandler(handle_continue, pattern="^continue_[0-9]$"))
-    application.add_error_handler(error_handler)
+    register_handlers(application)
     
     # Запускаем бота
     logging.info("Бот запускается...")
     logging.info(f"Администраторы: {admin_ids}")
     application.run_polling(drop_pending_updates=True)
 
+def shard_worker_main(shard_index: int, shard_count: int, update_queue):
+    """Точка входа процесса-обработчика: обрабатывает обновления своих пользователей"""
+    logging.info(f"Шард {shard_index}/{shard_count} запускается...")
+    results_storage.aggregator = SharedAggregator(AGGREGATE_DB)
+    results_storage.archive = UserArchive(USER_ARCHIVE_DB)
+    # У каждого шарда свой файл журнала, запросы просматривают и файлы других шардов
+    results_storage.audit_log = AuditLog(f"{AUDIT_LOG_FILE}.shard{shard_index}", base_path=AUDIT_LOG_FILE)
+    asyncio.run(run_shard_worker(shard_index, shard_count, update_queue))
+
+async def run_shard_worker(shard_index: int, shard_count: int, update_queue):
+    """Цикл процесса-обработчика: берет обновления из очереди и передает их в Application"""
+    # Обновления приходят от маршрутизатора, поэтому собственный Updater не нужен
+    application = Application.builder().token(BOT_TOKEN).updater(None).build()
+    register_handlers(application)
+    
+    aggregator = results_storage.aggregator
+    epoch = aggregator.epoch()
+    restored = aggregator.load_partition(results_storage, shard_index, shard_count)
+    logging.info(f"Шард {shard_index}: восстановлено голосов после перезапуска: {restored}")
+    loop = asyncio.get_running_loop()
+    
+    async with application:
+        await application.start()
+        start_background_task(memory_governor_loop())
+        while True:
+            data = await loop.run_in_executor(None, update_queue.get)
+            if data is None:
+                break
+            
+            # Результаты сбросили в другом шарде - сбрасываем и локальный прогресс
+            current_epoch = aggregator.epoch()
+            if current_epoch != epoch:
+                epoch = current_epoch
+                results_storage.user_progress = {}
+                results_storage.user_answers = {}
+                results_storage.user_info = {}
+                results_storage.results = {i: {"yes": 0, "no": 0} for i in range(len(QUESTIONS))}
+                results_storage.activity_index = OrderedDict()
+            
+            await application.update_queue.put(Update.de_json(data, application.bot))
+        await application.stop()
+    logging.info(f"Шард {shard_index} остановлен")
+
+def run_sharded(shard_count: int):
+    """Запускает маршрутизатор обновлений и процессы-обработчики по шардам"""
+    if not BOT_TOKEN:
+        logging.error("BOT_TOKEN не задан в переменных окружения!")
+        return
+    
+    # Создаем базу агрегации заранее, чтобы процессы не гонялись за создание таблиц
+    if results_storage.aggregator is None:
+        results_storage.aggregator = SharedAggregator(AGGREGATE_DB)
+    
+    import multiprocessing
+    mp_context = multiprocessing.get_context("spawn")
+    queues = [mp_context.Queue() for _ in range(shard_count)]
+    workers = [
+        mp_context.Process(target=shard_worker_main, args=(i, shard_count, queues[i]), name=f"shard-{i}")
+        for i in range(shard_count)
+    ]
+    for worker in workers:
+        worker.start()
+    
+    async def route_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Передает обновление процессу, которому принадлежит пользователь"""
+        user = update.effective_user
+        shard = shard_for_user(user.id, shard_count) if user else 0
+        queues[shard].put(update.to_dict())
+        raise ApplicationHandlerStop
+    
+    async def router_post_init(application: Application):
+        startup_timeline.mark("инициализация маршрутизатора")
+        # Аналитика по сводным данным шардов считается один раз - в маршрутизаторе
+        start_background_task(analytics_loop())
+        if WEB_MODE == "async":
+            await start_async_web_server()
+        startup_timeline.log()
+    
+    async def router_post_stop(application: Application):
+        for task in list(background_tasks):
+            task.cancel()
+        await stop_async_web_server()
+    
+    # Маршрутизатор только получает обновления и раздает их по шардам
+    application = Application.builder().token(BOT_TOKEN).post_init(router_post_init).post_stop(router_post_stop).build()
+    application.add_handler(TypeHandler(Update, route_update), group=-1)
+    
+    logging.info(f"Бот запускается в шардированном режиме: {shard_count} процессов")
+    logging.info(f"Администраторы: {admin_ids}")
+    try:
+        application.run_polling(drop_pending_updates=True)
+    finally:
+        for update_queue in queues:
+            update_queue.put(None)
+        for worker in workers:
+            worker.join(timeout=10)
+
+web_server = None
+
+def start_web_server():
+    """Запускает веб-сервер в отдельном потоке для Replit.
+    
+    Используется легкий сервер из стандартной библиотеки, а Flask и шаблоны
+    отчетов загружаются только при первом запросе.
+    """
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+    
+    class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+    
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            logging.debug(f"{self.address_string()} - {format % args}")
+    
+    server = make_server('0.0.0.0', PORT, web_app, server_class=ThreadingWSGIServer, handler_class=QuietRequestHandler)
+    web_thread = threading.Thread(target=server.serve_forever, name="web")
+    web_thread.daemon = True
+    web_thread.start()
+    
+    global web_server
+    web_server = server
+    return server
+
+def parse_args():
+    """Аргументы командной строки"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Telegram бот опроса для воспитателей")
+    parser.add_argument("--shards", type=int, default=SHARD_COUNT,
+                        help="Количество процессов-обработчиков (по умолчанию SHARD_COUNT или 1)")
+    parser.add_argument("--import-votes", metavar="FILE", action="append", default=[],
+                        help="Загрузить голоса из CSV (формат экспорта) или JSONL перед запуском")
+    parser.add_argument("--import-only", action="store_true",
+                        help="Только импортировать голоса и завершить работу, не запуская бота")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    # Запускаем Flask в отдельном потоке для Replit
-    from threading import Thread
-    flask_thread = Thread(target=lambda: app.run(host='0.0.0.0', port=PORT, debug=False, use_reloader=False))
-    flask_thread.daemon = True
-    flask_thread.start()
+    args = parse_args()
+    startup_timeline.mark("конфигурация")
+    
+    if args.shards > 1:
+        results_storage.aggregator = SharedAggregator(AGGREGATE_DB)
+    else:
+        # Результаты, сохраненные при прошлой остановке (или последней контрольной точке)
+        results_storage.archive = UserArchive(USER_ARCHIVE_DB)
+        results_storage.audit_log = AuditLog(AUDIT_LOG_FILE)
+        recovered = results_storage.load_checkpoint(CHECKPOINT_FILE)
+        logging.info(f"Восстановлено голосов после перезапуска: {recovered}")
+    
+    # Восстанавливаем состояние из файлов до запуска бота
+    for path in args.import_votes:
+        import_votes_file(path)
+    if args.import_only:
+        if args.shards <= 1 and args.import_votes:
+            # Импорт без запуска бота сохраняется в контрольную точку для следующего запуска
+            reloaded = dict(results_storage.archived_resident)
+            write_file_atomic(CHECKPOINT_FILE, results_storage.checkpoint_payload())
+            results_storage.release_archived(reloaded)
+        raise SystemExit(0)
+    startup_timeline.mark("хранилище")
+    
+    # Запускаем веб-сервер в отдельном потоке для Replit
+    # (асинхронный веб-интерфейс запускается вместе с ботом в его цикле событий)
+    if WEB_MODE != "async":
+        start_web_server()
+        startup_timeline.mark("веб-сервер")
     
     # Запускаем бота в основном потоке
-    main()
+    if args.shards > 1:
+        run_sharded(args.shards)
+    else:
+        main()
@@ -0,0 +1,132 @@
+// Графики HTML-отчета: данные берутся из <script id="report-data">,
+// рисование на canvas без сторонних библиотек
+(function () {
+    var YES_COLOR = '#28a745';
+    var NO_COLOR = '#dc3545';
+    var TEXT_COLOR = '#333';
+
+    function setupCanvas(canvas) {
+        var ratio = window.devicePixelRatio || 1;
+        var width = canvas.clientWidth;
+        var height = canvas.clientHeight;
+        canvas.width = width * ratio;
+        canvas.height = height * ratio;
+        var ctx = canvas.getContext('2d');
+        ctx.scale(ratio, ratio);
+        ctx.font = '12px Arial, sans-serif';
+        return { ctx: ctx, width: width, height: height };
+    }
+
+    function drawLegend(ctx, items, x, y) {
+        items.forEach(function (item) {
+            ctx.fillStyle = item.color;
+            ctx.fillRect(x, y - 9, 12, 12);
+            ctx.fillStyle = TEXT_COLOR;
+            ctx.textAlign = 'left';
+            ctx.fillText(item.label, x + 16, y + 1);
+            x += ctx.measureText(item.label).width + 36;
+        });
+    }
+
+    function drawTitle(ctx, text, width) {
+        ctx.fillStyle = TEXT_COLOR;
+        ctx.textAlign = 'center';
+        ctx.font = 'bold 14px Arial, sans-serif';
+        ctx.fillText(text, width / 2, 16);
+        ctx.font = '12px Arial, sans-serif';
+    }
+
+    function drawBarChart(canvas, data) {
+        var c = setupCanvas(canvas), ctx = c.ctx;
+        var left = 40, top = 50, bottom = 30;
+        var plotHeight = c.height - top - bottom;
+        var plotWidth = c.width - left - 10;
+        var max = Math.max.apply(null, data.yes.concat(data.no).concat([1]));
+
+        drawTitle(ctx, 'Распределение ответов по вопросам', c.width);
+        drawLegend(ctx, [{ label: '✅ Да', color: YES_COLOR }, { label: '❌ Нет', color: NO_COLOR }], left, 36);
+
+        ctx.strokeStyle = '#ccc';
+        ctx.fillStyle = TEXT_COLOR;
+        ctx.textAlign = 'right';
+        for (var step = 0; step <= 4; step++) {
+            var value = Math.round(max * step / 4);
+            var y = top + plotHeight - plotHeight * step / 4;
+            ctx.fillText(value, left - 6, y + 4);
+            ctx.beginPath();
+            ctx.moveTo(left, y);
+            ctx.lineTo(left + plotWidth, y);
+            ctx.stroke();
+        }
+
+        var groupWidth = plotWidth / data.labels.length;
+        var barWidth = Math.min(40, groupWidth / 3);
+        ctx.textAlign = 'center';
+        data.labels.forEach(function (label, i) {
+            var x = left + groupWidth * i + groupWidth / 2;
+            var yesHeight = plotHeight * data.yes[i] / max;
+            var noHeight = plotHeight * data.no[i] / max;
+            ctx.fillStyle = YES_COLOR;
+            ctx.fillRect(x - barWidth, top + plotHeight - yesHeight, barWidth, yesHeight);
+            ctx.fillStyle = NO_COLOR;
+            ctx.fillRect(x, top + plotHeight - noHeight, barWidth, noHeight);
+            ctx.fillStyle = TEXT_COLOR;
+            ctx.fillText(label, x, c.height - 10);
+        });
+    }
+
+    function drawDoughnut(canvas, question) {
+        var c = setupCanvas(canvas), ctx = c.ctx;
+        var total = question.yes + question.no;
+        var radius = Math.min(c.width, c.height - 70) / 2;
+        var cx = c.width / 2, cy = 30 + radius;
+
+        drawTitle(ctx, 'Вопрос ' + question.number, c.width);
+        var slices = total > 0
+            ? [{ value: question.yes, color: YES_COLOR }, { value: question.no, color: NO_COLOR }]
+            : [{ value: 1, color: '#e9ecef' }];
+        var start = -Math.PI / 2;
+        var sum = slices.reduce(function (acc, slice) { return acc + slice.value; }, 0);
+        slices.forEach(function (slice) {
+            var angle = 2 * Math.PI * slice.value / sum;
+            ctx.beginPath();
+            ctx.moveTo(cx, cy);
+            ctx.arc(cx, cy, radius, start, start + angle);
+            ctx.closePath();
+            ctx.fillStyle = slice.color;
+            ctx.fill();
+            start += angle;
+        });
+        ctx.beginPath();
+        ctx.arc(cx, cy, radius * 0.55, 0, 2 * Math.PI);
+        ctx.fillStyle = '#fff';
+        ctx.fill();
+
+        var legend = [
+            { label: '✅ Да (' + question.yes_percent + '%)', color: YES_COLOR },
+            { label: '❌ Нет (' + question.no_percent + '%)', color: NO_COLOR }
+        ];
+        ctx.font = '12px Arial, sans-serif';
+        var legendWidth = legend.reduce(function (acc, item) { return acc + ctx.measureText(item.label).width + 36; }, 0);
+        drawLegend(ctx, legend, Math.max(0, (c.width - legendWidth) / 2), c.height - 10);
+    }
+
+    function render() {
+        var data = JSON.parse(document.getElementById('report-data').textContent);
+        drawBarChart(document.getElementById('overallChart'), {
+            labels: data.questions.map(function (q) { return 'Вопрос ' + q.number; }),
+            yes: data.questions.map(function (q) { return q.yes; }),
+            no: data.questions.map(function (q) { return q.no; })
+        });
+        data.questions.forEach(function (question, i) {
+            drawDoughnut(document.getElementById('chart' + i), question);
+        });
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', render);
+    } else {
+        render();
+    }
+    window.addEventListener('resize', render);
+})();